@@ -0,0 +1,107 @@
+# 2026-10-18
+#
+# Read-only JSON API with HTTP caching, so browsers and the reverse proxy can
+# serve repeat reads without reaching the app:
+#
+#   GET /api/homes/<home_id>/days/<date>                 DayRecord.to_dict() of get_data_for_date_and_home
+#   GET /api/homes/<home_id>/days?start=...&end=...      {"days": [{"date": ..., **data}, ...]}
+#
+# Responses carry a strong ETag over the body and answer If-None-Match with
+# 304. A day is final, and sent with Cache-Control: immutable, once it is at
+# least API_IMMUTABLE_AFTER_DAYS (default 2) old, so the nightly scoring job has
+# run, and both utilities have data. Anything newer, or a day still missing a
+# utility (late or partial ingests may fill it), must be revalidated.
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+
+MAX_RANGE_DAYS = 366
+
+
+def _parse_date(value):
+    from flask import abort
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        abort(400, "dates must be given as YYYY-MM-DD")
+
+
+# Both utilities delivered for the day
+def _complete(data):
+    return bool(data.water and data.electricity)
+
+
+# JSON response with a strong content-hash ETag; immutable only when `complete`
+# (every requested day is complete) and `last_date` is past the grace period
+def _cached_json(payload, last_date, complete):
+    from flask import Response, request
+
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    etag = hashlib.sha256(body.encode()).hexdigest()
+    age = (datetime.now().date() - last_date.date()).days
+    if complete and age >= int(os.getenv("API_IMMUTABLE_AFTER_DAYS", "2")):
+        max_age = int(os.getenv("API_IMMUTABLE_MAX_AGE", str(365 * 24 * 3600)))
+        cache_control = f'public, max-age={max_age}, immutable'
+    else:
+        cache_control = 'no-cache'
+
+    # compression.py tags compressed representations as "<etag>-<encoding>"
+    if any(request.if_none_match.contains(etag + suffix) for suffix in ('', '-gzip', '-br')):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def get_day(home_id, date):
+    from flask import abort
+    from dash_app import get_data_for_date_and_home
+
+    day = _parse_date(date)
+    data = get_data_for_date_and_home(day.strftime('%Y-%m-%d'), home_id)
+    if data is None:
+        abort(503, "data source unavailable")
+    return _cached_json(data.to_dict(), day, _complete(data))
+
+
+# Days in [start, end] read with one range scan per utility
+def get_days(home_id):
+    from flask import abort, request
+    from dash_app import build_day_data
+    from replica import get_analytics_storage
+
+    start = _parse_date(request.args.get('start'))
+    end = _parse_date(request.args.get('end', request.args.get('start')))
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        abort(400, f"end must be on or after start and the range at most {MAX_RANGE_DAYS} days")
+
+    first, last = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    try:
+        storage = get_analytics_storage(last, first)
+        water_docs = {doc['date']: doc for doc in storage.get_range('water', home_id, first, last)}
+        electricity_docs = {doc['date']: doc for doc in storage.get_range('electricity', home_id, first, last)}
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        abort(503, "data source unavailable")
+
+    days = []
+    complete = True
+    for offset in range((end - start).days + 1):
+        date = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        if date in water_docs or date in electricity_docs:
+            data = build_day_data(water_docs.get(date), electricity_docs.get(date))
+            complete = complete and _complete(data)
+            days.append(dict(data.to_dict(), date=date))
+        else:
+            complete = False
+    payload = {'home_id': home_id, 'start': first, 'end': last, 'days': days}
+    return _cached_json(payload, end, complete)
+
+
+def init_app(server):
+    server.add_url_rule('/api/homes/<home_id>/days/<date>', 'api_get_day', get_day)
+    server.add_url_rule('/api/homes/<home_id>/days', 'api_get_days', get_days)
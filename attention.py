@@ -0,0 +1,92 @@
+# 2026-10-18
+#
+# Nightly fleet status classification.
+#
+#   python attention.py                   # classify every home for yesterday
+#   python attention.py --date 2024-07-28
+#
+# Reads one day's scores for all homes with one query per utility, runs the same
+# activity/regularity/status classification as the dashboard and stores the
+# results in the small, indexed status collection. The dashboard's "Needs
+# Attention" page reads the flagged homes from there.
+
+import argparse
+from datetime import datetime, timedelta
+
+from db import UTILITIES, get_collection
+
+SCORE_PROJECTION = {
+    '_id': 0, 'home_id': 1, 'active_score': 1, 'correlation_coefficient': 1,
+    'low_norm': 1, 'norm_active_score': 1, 'high_norm': 1,
+}
+
+
+# Classify one score document the way update_usage_dashboard does
+def classify(doc):
+    from dash_app import determine_activity_level, determine_regularity_level, determine_status
+
+    active_score = round(doc.get('active_score') or 0.0, 3)
+    corr_coef = round(doc.get('correlation_coefficient') or 0.0, 3)
+    activity_level, _ = determine_activity_level(
+        active_score,
+        round(doc.get('low_norm') or 0.0, 3),
+        round(doc.get('norm_active_score') or 0.0, 3),
+        round(doc.get('high_norm') or 0.0, 3)
+    )
+    regularity_level, _ = determine_regularity_level(corr_coef)
+    status, _ = determine_status(activity_level, regularity_level)
+    return {
+        'status': status,
+        'activity_level': activity_level,
+        'regularity_level': regularity_level,
+        'active_score': active_score,
+        'correlation_coefficient': corr_coef,
+    }
+
+
+# Classify every home for `date` (YYYY-MM-DD) and upsert the results in bulk
+def classify_fleet(date):
+    from pymongo import UpdateOne
+
+    computed_at = datetime.now()
+    requests = []
+    for utility, spec in UTILITIES.items():
+        day = datetime.strptime(date, '%Y-%m-%d').strftime(spec['date_format'])
+        for doc in get_collection(utility).find({'date': day}, SCORE_PROJECTION):
+            result = classify(doc)
+            result.update(home_id=doc['home_id'], date=date, utility=utility, computed_at=computed_at)
+            requests.append(UpdateOne(
+                {'_id': f"{doc['home_id']}|{date}|{utility}"}, {'$set': result}, upsert=True
+            ))
+    if requests:
+        get_collection('status').bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def ensure_indexes():
+    get_collection('status').create_index([('date', 1), ('status', 1), ('home_id', 1)])
+
+
+# Homes flagged "Attention" on `date`, one entry per home and utility
+def get_flagged_homes(date, status='Attention'):
+    cursor = get_collection('status').find(
+        {'date': date, 'status': status},
+        {'_id': 0, 'home_id': 1, 'utility': 1, 'activity_level': 1, 'regularity_level': 1}
+    ).sort('home_id', 1)
+    return list(cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify every home's status for one day")
+    parser.add_argument('--date', help="day to classify (YYYY-MM-DD), defaults to yesterday")
+    args = parser.parse_args()
+
+    date = args.date or (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+    ensure_indexes()
+    count = classify_fleet(date)
+    flagged = get_flagged_homes(date)
+    print(f"{date}: classified {count} home/utility pairs, {len(flagged)} need attention")
+
+
+if __name__ == '__main__':
+    main()
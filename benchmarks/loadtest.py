@@ -0,0 +1,332 @@
+# 2026-10-18
+#
+# Load test for the dashboard: simulated users replay the Dash callback POSTs
+# a browser sends to /_dash-update-component while stepping through dates,
+# toggling water/electricity and switching homes.
+#
+#   python benchmarks/loadtest.py --users 20 --duration 60
+#   python benchmarks/loadtest.py --server-cmd "gunicorn -w 4 -b {host}:{port} dash_app:server"
+#   python benchmarks/loadtest.py --url http://dashboard.internal:8050 --homes Home_2127,Home_2128 --end 2024-07-31
+#
+# Without --url a worker is launched locally against a seeded stand-in for
+# MongoDB: a temporary SQLite file (STORAGE_BACKEND=sqlite) filled with
+# synthetic daily documents in the collections' schema, so no database
+# service is needed. --server-cmd replaces the default Flask development
+# server, e.g. to measure the production server mode.
+#
+# Reports throughput, latency percentiles per callback and error rates, and
+# exits non-zero when the error rate exceeds --max-error-rate.
+
+import argparse
+from datetime import date, timedelta
+import http.client
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from db import INTERVALS_PER_DAY
+
+MAIN_OUTPUTS = [
+    ('status', 'children'), ('status-rect', 'figure'),
+    ('activity-level', 'children'), ('activity-circle', 'figure'),
+    ('regularity-level', 'children'), ('regularity-circle', 'figure'),
+    ('usage-dashboard-water', 'children'), ('usage-dashboard-electricity', 'children'),
+    ('usage-water-norm', 'children'), ('usage-electricity-norm', 'children'),
+    ('water-consumption', 'children'), ('electricity-consumption', 'children'),
+]
+
+# Callback name -> (outputs, [(component id, property, user state key)])
+CALLBACKS = {
+    'dashboard': (MAIN_OUTPUTS, [
+        ('usage-picker-sidebar', 'value', 'usage'), ('date-picker-sidebar', 'date', 'date'),
+        ('home-id-picker-sidebar', 'value', 'home_id'),
+        ('compare-date-picker-sidebar', 'date', None), ('compare-home-id-picker-sidebar', 'value', None),
+        ('fleet-bands-sidebar', 'value', 'fleet_bands'),
+    ]),
+    'selected-info': ([('selected-info', 'children')], [
+        ('home-id-picker-sidebar', 'value', 'home_id'), ('date-picker-sidebar', 'date', 'date'),
+        ('usage-picker-sidebar', 'value', 'usage'),
+    ]),
+    'attention': ([('attention-list', 'children')], [
+        ('date-picker-sidebar', 'date', 'date'),
+    ]),
+    'trend': ([('usage-trend', 'children')], [
+        ('usage-picker-sidebar', 'value', 'usage'), ('home-id-picker-sidebar', 'value', 'home_id'),
+        ('trend-picker', 'value', 'trend'),
+    ]),
+    'heatmap': ([('usage-heatmap', 'children')], [
+        ('usage-picker-sidebar', 'value', 'usage'), ('date-picker-sidebar', 'date', 'date'),
+        ('home-id-picker-sidebar', 'value', 'home_id'), ('heatmap-picker', 'value', 'heatmap_days'),
+    ]),
+}
+
+# User action -> (changed component property, callbacks the browser fires for it, weight).
+# Picker changes are made on the dashboard page; the open-* actions visit
+# another page, whose callbacks fire once with the current picker values.
+ACTIONS = {
+    'step-date': ('date-picker-sidebar.date', ['dashboard', 'selected-info'], 6),
+    'toggle-usage': ('usage-picker-sidebar.value', ['dashboard', 'selected-info'], 2),
+    'switch-home': ('home-id-picker-sidebar.value', ['dashboard', 'selected-info'], 2),
+    'open-trends': ('trend-picker.value', ['trend'], 1),
+    'open-heatmap': ('heatmap-picker.value', ['heatmap'], 1),
+    'open-attention': ('attention-list.id', ['attention'], 1),
+}
+
+
+# Request body for one callback, in the format dash-renderer posts
+def callback_body(name, state, changed):
+    outputs, inputs = CALLBACKS[name]
+    ids = [f'{i}.{p}' for i, p in outputs]
+    outputs = [{'id': i, 'property': p} for i, p in outputs]
+    # Single-output callbacks are posted without the multi-output wrapping
+    if len(outputs) == 1:
+        output, outputs = ids[0], outputs[0]
+    else:
+        output = '..' + '...'.join(ids) + '..'
+    return json.dumps({
+        'output': output,
+        'outputs': outputs,
+        'inputs': [{'id': i, 'property': p, 'value': state.get(key) if key else None} for i, p, key in inputs],
+        'changedPropIds': [changed],
+    })
+
+
+# Synthetic daily documents for `homes` over the `days` days ending at `end`
+def synthetic_documents(homes, end, days, rng):
+    for home_id in homes:
+        for offset in range(days):
+            day = (end - timedelta(days=offset)).strftime('%Y-%m-%d')
+            scores = {
+                'active_score': rng.random(), 'correlation_coefficient': rng.random(),
+                'low_norm': 0.2, 'norm_active_score': 0.5, 'high_norm': 0.8,
+            }
+            yield 'water', dict(
+                scores, home_id=home_id, date=day,
+                usage=[rng.random() for _ in range(INTERVALS_PER_DAY)],
+                four_week_usage_norm=[rng.random() * 100 for _ in range(INTERVALS_PER_DAY)],
+                water_consumption=[rng.random() * 6 for _ in range(INTERVALS_PER_DAY)],
+            )
+            yield 'electricity', dict(
+                scores, home_id=home_id, date=day,
+                appliance_usage=[rng.random() for _ in range(INTERVALS_PER_DAY)],
+                four_week_active_score=[rng.random() * 100 for _ in range(INTERVALS_PER_DAY)],
+                power=[rng.random() * 6 for _ in range(INTERVALS_PER_DAY)],
+            )
+
+
+def seed_sqlite(path, homes, end, days, seed=0):
+    from storage import SQLiteStorage
+
+    storage = SQLiteStorage(path)
+    rng = random.Random(seed)
+    batches = {'water': [], 'electricity': []}
+    for utility, doc in synthetic_documents(homes, end, days, rng):
+        batches[utility].append(doc)
+    for utility, docs in batches.items():
+        storage.put_documents(utility, docs)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Launch a worker on the seeded SQLite file and wait until /healthz answers
+def start_server(sqlite_path, server_cmd=None, timeout=60):
+    host, port = '127.0.0.1', free_port()
+    if server_cmd:
+        command = shlex.split(server_cmd.format(host=host, port=port))
+    else:
+        command = [
+            sys.executable, '-c',
+            f"import dash_app; dash_app.get_app().run(host='{host}', port={port}, debug=False, threaded=True)",
+        ]
+    env = dict(
+        os.environ, STORAGE_BACKEND='sqlite', SQLITE_PATH=sqlite_path, WARM_CACHE='0', PROFILE_REQUESTS='',
+    )
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}: {' '.join(command)}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return process, f'http://{host}:{port}'
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server did not become healthy within {timeout}s")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# One simulated user: picks weighted actions, updates its picker state and
+# posts the callbacks the action triggers over a keep-alive connection
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, homes, dates, stop_at, think_time, seed):
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.homes = homes
+        self.dates = dates
+        self.stop_at = stop_at
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.index = self.rng.randrange(len(dates))
+        self.state = {
+            'usage': self.rng.choice(['water', 'electricity']), 'date': dates[self.index],
+            'home_id': self.rng.choice(homes), 'trend': 'week', 'heatmap_days': 90, 'fleet_bands': [],
+        }
+        # (callback name, seconds, status or error)
+        self.samples = []
+        self.actions = 0
+
+    def step(self, action):
+        if action == 'step-date':
+            if self.index in (0, len(self.dates) - 1):
+                direction = 1 if self.index == 0 else -1
+            else:
+                direction = self.rng.choice([-1, 1])
+            self.index += direction
+            self.state['date'] = self.dates[self.index]
+        elif action == 'toggle-usage':
+            self.state['usage'] = 'electricity' if self.state['usage'] == 'water' else 'water'
+        elif action == 'switch-home' and len(self.homes) > 1:
+            self.state['home_id'] = self.rng.choice([h for h in self.homes if h != self.state['home_id']])
+
+    def post(self, conn, name, changed):
+        body = callback_body(name, self.state, changed)
+        started = time.perf_counter()
+        try:
+            conn.request('POST', self.prefix + '/_dash-update-component', body=body, headers={
+                'Content-Type': 'application/json', 'Accept-Encoding': 'gzip',
+            })
+            response = conn.getresponse()
+            response.read()
+            outcome = response.status
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            outcome = type(e).__name__
+        self.samples.append((name, time.perf_counter() - started, outcome))
+
+    def run(self):
+        names = list(ACTIONS)
+        weights = [ACTIONS[name][2] for name in names]
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        while time.monotonic() < self.stop_at:
+            action = self.rng.choices(names, weights)[0]
+            changed, callbacks, _ = ACTIONS[action]
+            self.step(action)
+            for name in callbacks:
+                self.post(conn, name, changed)
+            self.actions += 1
+            if self.think_time:
+                time.sleep(self.rng.expovariate(1 / self.think_time))
+        conn.close()
+
+
+def run_load(base_url, homes, dates, users, duration, think_time, seed=0):
+    stop_at = time.monotonic() + duration
+    workers = [VirtualUser(base_url, homes, dates, stop_at, think_time, seed + i) for i in range(users)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    samples = [sample for worker in workers for sample in worker.samples]
+    return samples, sum(worker.actions for worker in workers), elapsed
+
+
+def report(samples, actions, elapsed, users):
+    errors = [sample for sample in samples if sample[2] != 200]
+    print(f"{users} users, {elapsed:.1f}s: {len(samples)} requests ({len(samples) / elapsed:.1f} req/s), "
+          f"{actions} actions ({actions / elapsed:.1f} actions/s)")
+    print(f"errors: {len(errors)} ({len(errors) / len(samples) if samples else 0:.2%})")
+    outcomes = {}
+    for _, _, outcome in errors:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    for outcome, count in sorted(outcomes.items(), key=lambda kv: -kv[1]):
+        print(f"  {outcome}: {count}")
+
+    print(f"\n{'callback':<15}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in list(CALLBACKS) + ['all']:
+        rows = [sample for sample in samples if name in ('all', sample[0])]
+        if not rows:
+            continue
+        latencies = sorted(seconds * 1000 for _, seconds, _ in rows)
+        failed = sum(1 for row in rows if row[2] != 200)
+        print(f"{name:<15}{len(rows):>8}{failed:>8}" + ''.join(
+            f"{percentile(latencies, pct):>10.1f}" for pct in (50, 90, 95, 99, 100)
+        ))
+    return len(errors) / len(samples) if samples else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent dashboard users against a worker")
+    parser.add_argument('--users', type=int, default=10, help="concurrent simulated users (default 10)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run (default 30)")
+    parser.add_argument('--think-time', type=float, default=0.0, help="mean pause between a user's actions, in seconds")
+    parser.add_argument('--url', help="target an already running dashboard instead of launching one")
+    parser.add_argument('--server-cmd', help="command launching the local worker, with {host} and {port} placeholders")
+    parser.add_argument('--homes', default='20', help="number of seeded homes, or a comma-separated list with --url")
+    parser.add_argument('--days', type=int, default=60, help="days of data per home (default 60)")
+    parser.add_argument('--end', help="last day (YYYY-MM-DD) to browse; defaults to yesterday")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="fail above this error rate (default 0.01)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    end = date.fromisoformat(args.end) if args.end else date.today() - timedelta(days=1)
+    dates = [(end - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(args.days)][::-1]
+    if args.homes.isdigit():
+        homes = [f'Home_{2000 + i}' for i in range(int(args.homes))]
+    else:
+        homes = [home.strip() for home in args.homes.split(',') if home.strip()]
+
+    process = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            base_url = args.url
+        else:
+            sqlite_path = os.path.join(tmp, 'loadtest.sqlite')
+            print(f"Seeding {len(homes)} homes x {args.days} days into {sqlite_path}")
+            seed_sqlite(sqlite_path, homes, end, args.days, args.seed)
+            process, base_url = start_server(sqlite_path, args.server_cmd)
+        try:
+            print(f"Running {args.users} users for {args.duration:.0f}s against {base_url}\n")
+            samples, actions, elapsed = run_load(base_url, homes, dates, args.users, args.duration, args.think_time, args.seed)
+        finally:
+            if process is not None:
+                if process.poll() is not None:
+                    print(f"Server exited during the run with status {process.returncode}\n")
+                process.terminate()
+                process.wait(timeout=10)
+
+    error_rate = report(samples, actions, elapsed, args.users)
+    return 1 if error_rate > args.max_error_rate else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
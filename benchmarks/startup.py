@@ -0,0 +1,71 @@
+# 2026-10-18
+#
+# Startup-time budget for the dashboard worker.
+#
+#   python benchmarks/startup.py
+#
+# Measures `import dash_app` and `dash_app.create_app()` with `python -X importtime`
+# in fresh interpreters and exits non-zero when either exceeds its budget
+# (STARTUP_IMPORT_BUDGET_MS / STARTUP_APP_BUDGET_MS). No MongoDB is needed:
+# creating the app must not connect to the database. Background cache warming
+# is switched off so only start-up itself is measured.
+
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "50"))
+APP_BUDGET_MS = float(os.getenv("STARTUP_APP_BUDGET_MS", "2500"))
+TOP_IMPORTS = 10
+
+
+# Run a snippet with -X importtime and return {module: (nesting depth, cumulative_us)}
+def importtime(code):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=REPO_ROOT, env=dict(os.environ, WARM_CACHE='0'), capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        timings[module.strip()] = (depth, int(cumulative))
+    return timings
+
+
+# Wall-clock time of a snippet in a fresh interpreter, in milliseconds
+def wall_time_ms(code):
+    timer = 'import time; _t = time.perf_counter(); {}; print((time.perf_counter() - _t) * 1000)'
+    result = subprocess.run(
+        [sys.executable, '-c', timer.format(code)],
+        cwd=REPO_ROOT, env=dict(os.environ, WARM_CACHE='0'), capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    import_ms = importtime('import dash_app')['dash_app'][1] / 1000
+    app_ms = wall_time_ms('import dash_app; dash_app.create_app()')
+
+    print(f"import dash_app:      {import_ms:8.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    print(f"create_app():         {app_ms:8.1f} ms (budget {APP_BUDGET_MS:.0f} ms)")
+
+    # Top-level imports pulled in by creating the app, slowest first
+    timings = importtime('import dash_app; dash_app.create_app()')
+    top_level = {m: us for m, (depth, us) in timings.items() if depth == 0}
+    print("\nSlowest top-level imports during create_app():")
+    for module, us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:TOP_IMPORTS]:
+        print(f"  {us / 1000:8.1f} ms  {module}")
+
+    failed = import_ms > IMPORT_BUDGET_MS or app_ms > APP_BUDGET_MS
+    if failed:
+        print("\nStartup budget exceeded")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
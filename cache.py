@@ -0,0 +1,284 @@
+# 2026-10-18
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+from db import get_settings
+from memory import deep_sizeof, memory_budget
+import metrics
+import shared_cache
+
+# Days, figures and fleet bands are only cached once their day is closed, and
+# then change only when rescored. In the node-wide store (SHARED_CACHE=1)
+# invalidate_days, `shared_cache.py invalidate` and each warm-up drop a
+# rescored day for every worker, so entries there outlive the day between two
+# cache warm-ups and what warmup.py loads is still there for the morning's
+# visitors. Per-worker caches cannot be reached by another process's
+# invalidation and keep DEFAULT_TTLS, which bounds how long a rescored day is
+# served stale.
+CLOSED_DAY_TTL = 25 * 3600
+
+# Default size (entries) and time-to-live (seconds) per named cache, overridable
+# with <NAME>_CACHE_SIZE / <NAME>_CACHE_TTL in the environment. The warm-up
+# puts one data entry and two figures (water, electricity) per home in the
+# fleet, so DATA_CACHE_SIZE should be at least the number of homes and
+# FIGURE_CACHE_SIZE at least twice that, plus room for the days visitors
+# browse; the defaults cover fleets of up to 512 homes. MEMORY_BUDGET_MB
+# bounds what the entries may take.
+DEFAULT_SIZES = {'data': 1024, 'figure': 2048, 'heatmap': 32, 'fleet': 64}
+DEFAULT_TTLS = {'data': 900, 'figure': 900, 'heatmap': 900, 'fleet': 900}
+SHARED_TTLS = {'data': CLOSED_DAY_TTL, 'figure': CLOSED_DAY_TTL, 'fleet': CLOSED_DAY_TTL}
+
+# Order in which caches give up entries when MEMORY_BUDGET_MB is exceeded:
+# rendered figures and heatmaps go before the days they are built from
+EVICTION_ORDER = ['figure', 'heatmap', 'data', 'fleet']
+
+# Caches kept in the node-wide store with SHARED_CACHE=1: (how values are
+# serialized there, whether keys start with (home_id, date) rather than
+# (utility, date)). Everything is stored as JSON: days as DayRecord.to_dict(),
+# figures as the JSON Dash sends to the browser, fleet bands as nested lists.
+SHARED_CACHES = {'data': ('day', True), 'figure': ('figure', True), 'fleet': ('bands', False)}
+
+_lock = threading.Lock()
+_caches = {}
+
+
+# Thread-safe LRU cache with optional expiry, hit/miss counters and an
+# approximate byte count of the values it holds
+class LRUCache:
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.bytes -= entry[2]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Membership test that honours expiry but does not count as a hit or miss
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (self.ttl is None or time.monotonic() - entry[1] <= self.ttl)
+
+    def set(self, key, value):
+        size = deep_sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic(), size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize:
+                self.bytes -= self._entries.popitem(last=False)[1][2]
+        enforce_memory_budget()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.bytes -= entry[2]
+            return entry[0]
+
+    # Drop the least recently used entry, returning the bytes freed
+    def evict_oldest(self):
+        with self._lock:
+            if not self._entries:
+                return 0
+            size = self._entries.popitem(last=False)[1][2]
+            self.bytes -= size
+            return size
+
+    # Drop every entry whose key matches `predicate`, returning how many went
+    def discard_where(self, predicate):
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self.bytes -= self._entries.pop(key)[2]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Cache with the LRUCache interface backed by the node-wide shared store.
+# Values are serialized on every set and get and hold no memory in the worker;
+# the store's own size limit decides evictions.
+class SharedCache:
+    bytes = 0
+    maxsize = None
+
+    def __init__(self, name, store, ttl=None):
+        self.name = name
+        self.store = store
+        self.ttl = ttl
+        self.codec, self.per_home = SHARED_CACHES[name]
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, value):
+        if self.codec == 'day':
+            return json.dumps(value.to_dict()).encode()
+        if self.codec == 'bands':
+            from fleet import bands_to_json
+            return bands_to_json(value).encode()
+        from plotly.io.json import to_json_plotly
+        return to_json_plotly(value).encode()
+
+    def _decode(self, blob):
+        if self.codec == 'day':
+            from records import DayRecord
+            return DayRecord.from_dict(json.loads(blob))
+        if self.codec == 'bands':
+            from fleet import bands_from_json
+            return bands_from_json(blob)
+        return json.loads(blob)
+
+    def get(self, key, default=None):
+        blob = self.store.get(self.name, repr(key))
+        if blob is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self._decode(blob)
+
+    def __contains__(self, key):
+        return self.store.contains(self.name, repr(key))
+
+    def set(self, key, value):
+        home_id = key[0] if self.per_home else None
+        self.store.set(self.name, repr(key), self._encode(value), home_id, key[1], self.ttl)
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.store.delete(self.name, repr(key))
+        return value
+
+    def evict_oldest(self):
+        return 0
+
+    def discard_where(self, predicate):
+        return 0
+
+    def clear(self):
+        self.store.clear(self.name)
+
+    def __len__(self):
+        return self.store.stats().get(self.name, {}).get('size', 0)
+
+    def stats(self):
+        shared = self.store.stats().get(self.name, {})
+        lookups = self.hits + self.misses
+        return {
+            'size': shared.get('size', 0),
+            'maxsize': None,
+            'bytes': shared.get('bytes') or 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'shared': True,
+        }
+
+
+# Return the named process-wide cache, creating it from settings on first use
+def get_cache(name):
+    cache = _caches.get(name)
+    if cache is None:
+        get_settings()
+        with _lock:
+            cache = _caches.get(name)
+            if cache is None:
+                maxsize = int(os.getenv(f"{name.upper()}_CACHE_SIZE", DEFAULT_SIZES.get(name, 256)))
+                store = shared_cache.get_store() if name in SHARED_CACHES else None
+                ttl = os.getenv(
+                    f"{name.upper()}_CACHE_TTL", (SHARED_TTLS if store is not None else DEFAULT_TTLS).get(name)
+                )
+                ttl = float(ttl) if ttl else None
+                if store is not None:
+                    cache = SharedCache(name, store, ttl)
+                else:
+                    cache = LRUCache(name, maxsize, ttl)
+                _caches[name] = cache
+    return cache
+
+
+# Evict least recently used entries, in EVICTION_ORDER, until all caches
+# together fit in MEMORY_BUDGET_MB
+def enforce_memory_budget():
+    budget = memory_budget()
+    if not budget:
+        return
+    total = sum(cache.bytes for cache in list(_caches.values()))
+    if total <= budget:
+        return
+    names = EVICTION_ORDER + [name for name in list(_caches) if name not in EVICTION_ORDER]
+    for name in names:
+        cache = _caches.get(name)
+        while cache is not None and total > budget:
+            freed = cache.evict_oldest()
+            if not freed:
+                break
+            total -= freed
+            metrics.inc('cache_budget_evictions_total', cache=name)
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+# Drop everything cached from the given (home_id, date) days, e.g. after their
+# documents were rescored or re-ingested: from this process's caches and, with
+# SHARED_CACHE=1, for every worker on the node. A home_id of None drops the
+# whole date.
+def invalidate_days(days):
+    days = list(days)
+    for home_id, date in days:
+        for name, (_, per_home) in SHARED_CACHES.items():
+            cache = _caches.get(name)
+            if cache is None:
+                continue
+            if per_home and home_id is not None:
+                cache.discard_where(lambda key: key[0] == home_id and key[1] == date)
+            else:
+                cache.discard_where(lambda key: key[1] == date)
+        heatmaps = _caches.get('heatmap')
+        if heatmaps is not None:
+            # A heatmap covers the days up to its end date
+            heatmaps.discard_where(lambda key: home_id in (None, key[0]) and key[2] >= date)
+    store = shared_cache.get_store()
+    return store.invalidate(days) if store is not None else 0
@@ -0,0 +1,77 @@
+# 2026-10-18
+#
+# gzip/brotli compression for responses from the Flask server behind Dash,
+# mainly the figure JSON returned by /_dash-update-component.
+#
+#   COMPRESS_MIN_SIZE  smallest body worth compressing, in bytes (default 1024)
+#   COMPRESS_LEVEL     gzip level 1-9 (default 6)
+#   BROTLI_LEVEL       brotli quality 0-11 (default 4), used when the optional
+#                      'brotli' package is installed and the client accepts br
+#   COMPRESS=0         disable
+
+import gzip
+import os
+
+import metrics
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/javascript', 'text/html', 'text/css', 'text/javascript', 'text/plain', 'text/csv',
+)
+
+
+# The optional brotli package, or None when it is not installed
+def brotli_module():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def init_app(server):
+    if os.getenv("COMPRESS", "1") == "0":
+        return
+
+    min_size = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    gzip_level = int(os.getenv("COMPRESS_LEVEL", "6"))
+    brotli_level = int(os.getenv("BROTLI_LEVEL", "4"))
+    brotli = brotli_module()
+    encodings = ['br', 'gzip'] if brotli else ['gzip']
+
+    metrics.describe('compression_bytes_in_total', "Response bytes before compression")
+    metrics.describe('compression_bytes_out_total', "Response bytes after compression")
+    metrics.describe('compression_responses_total', "Responses compressed")
+
+    def compress_response(response):
+        from flask import request
+
+        # Streamed responses (e.g. /export) and already-encoded ones pass through untouched
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+            return response
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=brotli_level)
+        else:
+            compressed = gzip.compress(body, compresslevel=gzip_level)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # A strong ETag names one representation, so the compressed one gets its own
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+
+        metrics.inc('compression_bytes_in_total', len(body), encoding=encoding)
+        metrics.inc('compression_bytes_out_total', len(compressed), encoding=encoding)
+        metrics.inc('compression_responses_total', encoding=encoding)
+        return response
+
+    server.after_request(compress_response)
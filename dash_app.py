@@ -1,31 +1,35 @@
 # 2024-07-29
 
-import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output, State
-import plotly.graph_objs as go
 from datetime import datetime, timedelta
-import dash_bootstrap_components as dbc
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
-
-# Load environment variables from .env file
-load_dotenv('variables.env')
-
-# MongoDB Connection URI and Database Name from .env file
-MONGODB_URI = os.getenv("MONGODB_URI")
-MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
-WATER_COLLECTION = os.getenv("MONGODB_COLLECTION")
-ELECTRICITY_COLLECTION = os.getenv("MONGODB_COLLECTION_ELECTRICITY")
-ELECTR_COLLECTION = os.getenv("MONGODB_COLLECTION_ELECTR")
-
-# Connect to MongoDB using environment variables
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DATABASE]
-water_collection = db[WATER_COLLECTION]
-electricity_collection = db[ELECTRICITY_COLLECTION]
-electr_collection = db[ELECTR_COLLECTION]
+import threading
+
+import api
+from cache import get_cache
+import compression
+from db import get_settings
+import export
+from fleet import band_traces, get_fleet_bands
+import health
+import memory
+import metrics
+from prefetch import prefetch_adjacent
+from profiling import profiled
+from records import DayRecord
+from singleflight import SingleFlight
+import static_assets
+from storage import get_storage
+import warmup
+
+# Dash, plotly and the MongoDB client are imported and initialized lazily, so
+# importing this module is cheap and needs no configuration. The app itself is
+# built by create_app() on first access to `dash_app.app` / `dash_app.server`.
+_app = None
+_app_lock = threading.Lock()
+
+# Concurrent requests for the same (home, date) share one database fetch and
+# one figure build instead of each worker thread repeating them
+_data_flight = SingleFlight('data')
+_figure_flight = SingleFlight('figure')
 
 # Determine the activity level based on active score and norms
 def determine_activity_level(active_score, low_norm, norm_score, high_norm):
@@ -78,214 +82,298 @@ def determine_status(activity_level, regularity_level):
     else:
         return 'Unknown', 'gray'
 
+# Only closed days that have data are cached, so today's partial documents and
+# days the scoring job has not written yet are always read fresh.
+def is_cacheable(date, data):
+    return bool(data and data.has_data()) and date < datetime.now().strftime('%Y-%m-%d')
+
+# Cached front for fetch_data_for_date_and_home; concurrent misses for the
+# same day are coalesced into a single fetch
 def get_data_for_date_and_home(date, home_id):
+    data = get_cache('data').get((home_id, date))
+    if data is None:
+        data = _data_flight.do((home_id, date), load_data_for_date_and_home, date, home_id)
+    return data
+
+# Fetch a day and cache it before any coalesced waiters are released
+def load_data_for_date_and_home(date, home_id):
+    data = fetch_data_for_date_and_home(date, home_id)
+    if is_cacheable(date, data):
+        get_cache('data').set((home_id, date), data)
+    return data
+
+def fetch_data_for_date_and_home(date, home_id):
     try:
-        # Convert the date to the correct formats
-        water_date = date
-        electricity_date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y/%m/%d')
-        
-        # Fetch data from MongoDB
-        water_data = water_collection.find_one({'date': water_date, 'home_id': home_id})
-        electricity_data = electricity_collection.find_one({'date': electricity_date, 'home_id': home_id})
-        electr_data = electr_collection.find_one({'date': water_date, 'home_id': "home2127"})
-        
-        # Check if both water and electricity data exist
-        if water_data and electricity_data:
-            return {
-                'water_usage': water_data.get('usage', []),
-                'water_norm': water_data.get('four_week_usage_norm', []),
-                'water_consumption': water_data.get('water_consumption', []),
-                'water_active_score': round(water_data.get('active_score', 0.0), 3),
-                'water_corr_coef': round(water_data.get('correlation_coefficient', 0.0), 3),
-                'water_low_norm': round(water_data.get('low_norm', 0.0), 3),
-                'water_norm_score': round(water_data.get('norm_active_score', 0.0), 3),
-                'water_high_norm': round(water_data.get('high_norm', 0.0), 3),
-                
-                'electricity_usage': electricity_data.get('appliance_usage', []),
-                'electricity_norm': electricity_data.get('four_week_active_score', []),
-                'electricity_consumption': electricity_data.get('power', []),
-                'electricity_active_score': round(electricity_data.get('active_score', 0.0), 3),
-                'electricity_corr_coef': round(electricity_data.get('correlation_coefficient', 0.0), 3),
-                'electricity_low_norm': round(electricity_data.get('low_norm', 0.0), 3),
-                'electricity_norm_score': round(electricity_data.get('norm_active_score', 0.0), 3),
-                'electricity_high_norm': round(electricity_data.get('high_norm', 0.0), 3)
-            }
-        elif water_data:
-            # Handle case where only water data exists
-            return {
-                'water_usage': water_data.get('usage', []),
-                'water_norm': water_data.get('four_week_usage_norm', []),
-                'water_consumption': water_data.get('water_consumption', []),
-                'water_active_score': round(water_data.get('active_score', 0.0), 3),
-                'water_corr_coef': round(water_data.get('correlation_coefficient', 0.0), 3),
-                'water_low_norm': round(water_data.get('low_norm', 0.0), 3),
-                'water_norm_score': round(water_data.get('norm_active_score', 0.0), 3),
-                'water_high_norm': round(water_data.get('high_norm', 0.0), 3),
-                
-                'electricity_usage': [], 'electricity_norm': [],
-                'electricity_consumption': [], 'electricity_active_score': 0.0,
-                'electricity_corr_coef': 0.0, 'electricity_low_norm': 0.0,
-                'electricity_norm_score': 0.0, 'electricity_high_norm': 0.0
-            }
-        elif electricity_data:
-            # Handle case where only electricity data exists
-            return {
-                'water_usage': [], 'water_norm': [],
-                'water_consumption': [], 'water_active_score': 0.0,
-                'water_corr_coef': 0.0, 'water_low_norm': 0.0,
-                'water_norm_score': 0.0, 'water_high_norm': 0.0,
-                
-                'electricity_usage': electricity_data.get('appliance_usage', []),
-                'electricity_norm': electricity_data.get('four_week_active_score', []),
-                'electricity_consumption': electricity_data.get('power', []),
-                'electricity_active_score': round(electricity_data.get('active_score', 0.0), 3),
-                'electricity_corr_coef': round(electricity_data.get('correlation_coefficient', 0.0), 3),
-                'electricity_low_norm': round(electricity_data.get('low_norm', 0.0), 3),
-                'electricity_norm_score': round(electricity_data.get('norm_active_score', 0.0), 3),
-                'electricity_high_norm': round(electricity_data.get('high_norm', 0.0), 3)
-            }
-        else:
-            # Handle case where neither data exists
-            return {
-                'water_usage': [], 'water_norm': [],
-                'water_consumption': [], 'water_active_score': 0.0,
-                'water_corr_coef': 0.0, 'water_low_norm': 0.0,
-                'water_norm_score': 0.0, 'water_high_norm': 0.0,
-                
-                'electricity_usage': [], 'electricity_norm': [],
-                'electricity_consumption': [], 'electricity_active_score': 0.0,
-                'electricity_corr_coef': 0.0, 'electricity_low_norm': 0.0,
-                'electricity_norm_score': 0.0, 'electricity_high_norm': 0.0
-            }
+        # Fetch both utilities from the configured storage backend (MongoDB by default)
+        storage = get_storage()
+        water_data = storage.get_day('water', home_id, date)
+        electricity_data = storage.get_day('electricity', home_id, date)
+
+        return build_day_data(water_data, electricity_data)
     except Exception as e:
         print(f"Error fetching data: {e}")
         return None
 
-# Calculate previous day's date
-previous_day = datetime.now().date() - timedelta(days=1)
-
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Fetch several (date, home_id) pairs with one query per utility, returning
+# {(date, home_id): data}. Pairs already in the data cache are not queried.
+def get_data_for_pairs(pairs):
+    cache = get_cache('data')
+    results = {}
+    missing = []
+    for date, home_id in pairs:
+        data = cache.get((home_id, date))
+        if data is None:
+            missing.append((date, home_id))
+        else:
+            results[(date, home_id)] = data
+    if not missing:
+        return results
 
-app.layout = dbc.Container(fluid=True, children=[
-    dbc.Row(
-        [
-            dbc.Col(
-                width=3,
-                className='custom-sidebar',  # Define .custom-sidebar in your CSS file
-                # style={'margin-left': '10px', 'margin-right': '10px'},  # Adjust margin-left as needed
-                children=[
-                    # Sidebar for date, homeID, and usage pickers
-                    dbc.Button(">", id="toggle-button", color="primary", className="mb-3"),
-                    dbc.Collapse(
-                        id="collapse",
-                        is_open=False,
-                        children=[
-                            html.H2('Date Picker'),
-                            html.Button('<< Prev', id='prev-day-button', n_clicks=0, style={'marginRight': '10px'}),
-                            dcc.DatePickerSingle(
-                                id='date-picker-sidebar',
-                                date=previous_day,
-                                display_format='YYYY-MM-DD'
-                            ),
-                            html.Button('Next >>', id='next-day-button', n_clicks=0),
-                            html.H2('HomeID Picker'),
-                            dcc.Dropdown(
-                                id='home-id-picker-sidebar',
-                                options=[
-                                    {'label': 'Home_2127', 'value': 'Home_2127'}#,
-                                    # {'label': 'Home_2128', 'value': 'Home_2128'},
-                                    # {'label': 'Home_2129', 'value': 'Home_2129'}
-                                ],
-                                value='Home_2127',
-                                style={'width': '100%', 'marginTop': '10px'}
-                            ),
-                            html.H2('Usage Picker'),
-                            dcc.Dropdown(
-                                id='usage-picker-sidebar',
-                                options=[
-                                    {'label': 'Water Usage', 'value': 'water'},
-                                    {'label': 'Electricity Usage', 'value': 'electricity'}
-                                ],
-                                value='water'
-                            ),
-                        ],
-                    ),
-                ]
-            ),
-            dbc.Col(
-                id="right-section",
-                width=9,
-                children=[
-                    
-                    # Main section for displaying figures
-                    html.H2('Smart Meter Dashboard', className='text-center mb-4'),
-                        html.Div(
+    try:
+        storage = get_storage()
+        water_docs = storage.get_days('water', missing)
+        electricity_docs = storage.get_days('electricity', missing)
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        return results
+
+    for date, home_id in missing:
+        data = build_day_data(water_docs.get((date, home_id)), electricity_docs.get((date, home_id)))
+        if is_cacheable(date, data):
+            cache.set((home_id, date), data)
+        results[(date, home_id)] = data
+    return results
+
+# Build the dashboard's DayRecord from one day's water and electricity documents;
+# a missing document gives that utility empty series and zero scores
+def build_day_data(water_data, electricity_data):
+    return DayRecord.from_documents(water_data, electricity_data)
+
+HOME_OPTIONS = [
+    {'label': 'Home_2127', 'value': 'Home_2127'}#,
+    # {'label': 'Home_2128', 'value': 'Home_2128'},
+    # {'label': 'Home_2129', 'value': 'Home_2129'}
+]
+
+# Build the app shell: the sidebar with the pickers every page shares, the page
+# navigation and the container the current page is rendered into. Dash calls
+# this on every visit, so the default date is always yesterday; dash and
+# dash-bootstrap-components are only imported here.
+def build_layout():
+    import dash
+    from dash import dcc, html
+    import dash_bootstrap_components as dbc
+
+    # Calculate previous day's date
+    previous_day = datetime.now().date() - timedelta(days=1)
+
+    return dbc.Container(fluid=True, children=[
+        dbc.Row(
+            [
+                dbc.Col(
+                    width=3,
+                    className='custom-sidebar',  # Defined in static/custom.css
+                    # style={'margin-left': '10px', 'margin-right': '10px'},  # Adjust margin-left as needed
+                    children=[
+                        # Sidebar for date, homeID, and usage pickers
+                        dbc.Button(">", id="toggle-button", color="primary", className="mb-3"),
+                        dbc.Collapse(
+                            id="collapse",
+                            is_open=False,
                             children=[
-                                # Main section for displaying figures
-                                html.Div(id='selected-info', className='mb-4'),
-                                
-                                # Selected homeID and date
-                                # html.Div(id='selected-home-date', className='text-center mb-4'),
-
-                                # Status and Shape
-                                html.Div(children=[
-                                    html.P(id='status', style={'fontSize': 18}),
-                                    dcc.Graph(                                        
-                                        id='status-rect',
-                                        config={'displayModeBar': False}
-                                    )
-                                ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
-
-                                # Activity Level and Shape
-                                html.Div(children=[
-                                    html.P(id='activity-level', style={'fontSize': 18}),
-                                    dcc.Graph(
-                                        id='activity-circle',
-                                        config={'displayModeBar': False}
-                                    )
-                                ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
-                                
-                                # Regularity Level and Shape
-                                html.Div(children=[
-                                    html.P(id='regularity-level', style={'fontSize': 18}),
-                                    dcc.Graph(
-                                        id='regularity-circle',
-                                        config={'displayModeBar': False}
-                                    )
-                                ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
+                                html.H2('Date Picker'),
+                                html.Button('<< Prev', id='prev-day-button', n_clicks=0, style={'marginRight': '10px'}),
+                                dcc.DatePickerSingle(
+                                    id='date-picker-sidebar',
+                                    date=previous_day,
+                                    display_format='YYYY-MM-DD'
+                                ),
+                                html.Button('Next >>', id='next-day-button', n_clicks=0),
+                                html.H2('HomeID Picker'),
+                                dcc.Dropdown(
+                                    id='home-id-picker-sidebar',
+                                    options=HOME_OPTIONS,
+                                    value='Home_2127',
+                                    style={'width': '100%', 'marginTop': '10px'}
+                                ),
+                                html.H2('Usage Picker'),
+                                dcc.Dropdown(
+                                    id='usage-picker-sidebar',
+                                    options=[
+                                        {'label': 'Water Usage', 'value': 'water'},
+                                        {'label': 'Electricity Usage', 'value': 'electricity'}
+                                    ],
+                                    value='water'
+                                ),
                             ],
-                            
-                            style={'textAlign': 'center', 'marginBottom': '20px'}
                         ),
-                                
-                    html.Div(id='usage-dashboard-water'),
-                    html.Div(id='usage-dashboard-electricity'),
-                    html.Div(id='usage-water-norm'),
-                    html.Div(id='usage-electricity-norm'),
-                    html.Div(id='water-consumption'),
-                    html.Div(id='electricity-consumption')
-                ]
-            )
-        ])
-])
+                    ]
+                ),
+                dbc.Col(
+                    id="right-section",
+                    width=9,
+                    children=[
+                        dbc.Nav(
+                            [
+                                dbc.NavLink(page['name'], href=page['relative_path'], active='exact')
+                                for page in dash.page_registry.values()
+                            ],
+                            pills=True,
+                            className='mb-4'
+                        ),
+                        dash.page_container
+                    ]
+                )
+            ])
+    ])
+
+
+# Page layouts. Each is built when its page is opened; the keyword arguments
+# are the URL's query parameters, which the pages do not use.
+def dashboard_page(**_query):
+    from dash import dcc, html
+    import dash_bootstrap_components as dbc
+
+    return html.Div([
+        # Main section for displaying figures
+        html.H2('Smart Meter Dashboard', className='text-center mb-4'),
+        dbc.Row(
+            [
+                dbc.Col(dcc.DatePickerSingle(
+                    id='compare-date-picker-sidebar',
+                    placeholder='Compare date',
+                    clearable=True,
+                    display_format='YYYY-MM-DD'
+                ), width='auto'),
+                dbc.Col(dcc.Dropdown(
+                    id='compare-home-id-picker-sidebar',
+                    options=HOME_OPTIONS,
+                    placeholder='Compare home'
+                ), width=3),
+                dbc.Col(dcc.Checklist(
+                    id='fleet-bands-sidebar',
+                    options=[{'label': ' Fleet p10-p90 bands', 'value': 'on'}],
+                    value=[]
+                ), width='auto'),
+            ],
+            align='center',
+            className='mb-4'
+        ),
+            html.Div(
+                children=[
+                    # Main section for displaying figures
+                    html.Div(id='selected-info', className='mb-4'),
 
-@app.callback(
-    Output("collapse", "is_open"), Output("right-section", "width"),
-    [Input("toggle-button", "n_clicks")],
-    [State("collapse", "is_open"), State("right-section", "width")],
-)
+                    # Selected homeID and date
+                    # html.Div(id='selected-home-date', className='text-center mb-4'),
 
+                    # Status and Shape
+                    html.Div(children=[
+                        html.P(id='status', style={'fontSize': 18}),
+                        dcc.Graph(
+                            id='status-rect',
+                            config={'displayModeBar': False}
+                        )
+                    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
+
+                    # Activity Level and Shape
+                    html.Div(children=[
+                        html.P(id='activity-level', style={'fontSize': 18}),
+                        dcc.Graph(
+                            id='activity-circle',
+                            config={'displayModeBar': False}
+                        )
+                    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
+
+                    # Regularity Level and Shape
+                    html.Div(children=[
+                        html.P(id='regularity-level', style={'fontSize': 18}),
+                        dcc.Graph(
+                            id='regularity-circle',
+                            config={'displayModeBar': False}
+                        )
+                    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '10px'}),
+                ],
 
+                style={'textAlign': 'center', 'marginBottom': '20px'}
+            ),
+
+        html.Div(id='usage-dashboard-water'),
+        html.Div(id='usage-dashboard-electricity'),
+        html.Div(id='usage-water-norm'),
+        html.Div(id='usage-electricity-norm'),
+        html.Div(id='water-consumption'),
+        html.Div(id='electricity-consumption'),
+    ])
+
+
+def trends_page(**_query):
+    from dash import dcc, html
+
+    return html.Div([
+        html.H2('Trend Picker'),
+        dcc.Dropdown(
+            id='trend-picker',
+            options=[
+                {'label': 'Daily', 'value': 'day'},
+                {'label': 'Weekly', 'value': 'week'},
+                {'label': 'Monthly', 'value': 'month'}
+            ],
+            value='week',
+            clearable=False,
+            className='mb-4'
+        ),
+        html.Div(id='usage-trend')
+    ])
+
+
+def heatmap_page(**_query):
+    from dash import dcc, html
+
+    return html.Div([
+        html.H2('Heatmap Picker'),
+        dcc.Dropdown(
+            id='heatmap-picker',
+            options=[
+                {'label': 'Last 90 Days', 'value': 90},
+                {'label': 'Last Year', 'value': 365}
+            ],
+            value=90,
+            clearable=False,
+            className='mb-4'
+        ),
+        html.Div(id='usage-heatmap')
+    ])
+
+
+def attention_page(**_query):
+    from dash import html
+
+    return html.Div([
+        html.H2('Needs Attention'),
+        html.Div(id='attention-list')
+    ])
+
+
+# (path, navigation label, layout function) of each page, in navigation order
+PAGES = [
+    ('/', 'Dashboard', dashboard_page),
+    ('/trends', 'Trends', trends_page),
+    ('/heatmap', 'Heatmap', heatmap_page),
+    ('/attention', 'Needs Attention', attention_page),
+]
+
+
+# Add PAGES to Dash's page registry; must run after the Dash app is created
+def register_pages():
+    import dash
+
+    for order, (path, name, layout) in enumerate(PAGES):
+        dash.register_page(
+            layout.__name__, path=path, name=name, order=order,
+            title=f'{name} - Smart Meter Dashboard', layout=layout
+        )
 
-# def toggle_collapse(n, is_open, current_width):
-#     if n:
-#         is_open = not is_open
-#         if is_open:
-#             new_width = 9
-#         else:
-#             new_width = 12
-#         return is_open, new_width
-#     return is_open, current_width
 
 def toggle_collapse(n, is_open, current_width):
     if n:
@@ -297,18 +385,8 @@ def toggle_collapse(n, is_open, current_width):
     return is_open, current_width
 
 
-@app.callback(
-    [Output('selected-info', 'children'), Output('selected-home-date', 'children')],
-    [Input('home-id-picker-sidebar', 'value'), Input('date-picker-sidebar', 'date'), Input('usage-picker-sidebar', 'value')]
-)
-
-@app.callback(
-    Output('date-picker-sidebar', 'date'),
-    Input('prev-day-button', 'n_clicks'),
-    Input('next-day-button', 'n_clicks'),
-    State('date-picker-sidebar', 'date')
-)
 def update_selected_date(prev_clicks, next_clicks, selected_date):
+    import dash
     ctx = dash.callback_context
     if not ctx.triggered:
         button_id = None
@@ -325,70 +403,155 @@ def update_selected_date(prev_clicks, next_clicks, selected_date):
         new_date = date_obj
 
     return new_date.strftime('%Y-%m-%d')
-    
 
-@app.callback(
-    Output('date-output', 'children'),
-    Input('date-picker', 'date')
-)
-def update_output(selected_date):
-    return f"You have selected {selected_date}"
-    
+
 def update_selected_info(home_id, date, usage_picker_value):
+    from dash import html
     if home_id and date and usage_picker_value:
         selected_info = f"{home_id}     Date: {date}"
-        return selected_info, html.H3(selected_info, className='text-center mb-4')
-    return '', ''
+        return html.H3(selected_info, className='text-center mb-4')
+    return ''
+
+
+# Homes flagged "Attention" by the nightly classification job for the selected date
+def update_attention_list(selected_date):
+    from dash import html
+    from attention import get_flagged_homes
+
+    if not selected_date or get_storage().name != 'mongo':
+        return ''
+    try:
+        flagged = get_flagged_homes(selected_date)
+    except Exception as e:
+        print(f"Error fetching flagged homes: {e}")
+        return ''
+    if not flagged:
+        return html.P('No homes flagged')
+    return html.Ul([
+        html.Li(f"{row['home_id']} ({row['utility']}): {row['activity_level']} activity, {row['regularity_level']} regularity")
+        for row in flagged
+    ])
+
+# Trend of consumption and active score per day/week/month, read from the
+# analytical replica or else the rollup collection
+def update_usage_trend(selected_usage, selected_home_id, selected_granularity):
+    from dash import dcc, html
+    import plotly.graph_objs as go
+    from replica import get_analytics_rollups
+
+    if not (selected_usage and selected_home_id and selected_granularity):
+        return html.Div()
+    try:
+        rollups = get_analytics_rollups(selected_home_id, selected_usage, selected_granularity)
+    except Exception as e:
+        print(f"Error fetching rollups: {e}")
+        return html.Div()
+    if not rollups:
+        return html.Div()
+
+    periods = [r['period'] for r in rollups]
+    title = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly'}[selected_granularity]
+    trend_graph = dcc.Graph(
+        id='usage-trend-graph',
+        figure=go.Figure(
+            data=[
+                go.Bar(x=periods, y=[r.get('consumption_total') for r in rollups], name='Consumption'),
+                go.Scatter(x=periods, y=[r.get('active_score_avg') for r in rollups], name='Active Score',
+                           mode='lines+markers', yaxis='y2')
+            ],
+            layout=go.Layout(
+                xaxis={'title': 'Period', 'type': 'category'},
+                yaxis={'title': 'Consumption'},
+                yaxis2={'title': 'Active Score', 'overlaying': 'y', 'side': 'right', 'range': [0, 1]},
+                height=400
+            )
+        )
+    )
+    return html.Div([html.H3(f'{title} Trend', className='text-center mb-4'), trend_graph])
+
+# Calendar heatmap (days x 15-minute intervals) of consumption up to the selected date
+def update_usage_heatmap(selected_usage, selected_date, selected_home_id, selected_days):
+    from dash import dcc, html
+    from heatmap import get_usage_matrix, heatmap_figure
+
+    if not (selected_usage and selected_date and selected_home_id and selected_days):
+        return html.Div()
+    end = datetime.strptime(selected_date, '%Y-%m-%d')
+    try:
+        dates, matrix = get_usage_matrix(selected_home_id, selected_usage, end, selected_days)
+    except Exception as e:
+        print(f"Error fetching heatmap data: {e}")
+        return html.Div()
+
+    title = f'{selected_usage.capitalize()} consumption {dates[0]} to {dates[-1]}'
+    return html.Div([
+        html.H3('Consumption Heatmap', className='text-center mb-4'),
+        dcc.Graph(id='usage-heatmap-graph', figure=heatmap_figure(dates, matrix, title))
+    ])
 
 # Callback to update graphs based on date and home ID selection
-@app.callback(
-    [Output('status', 'children'), Output('status-rect', 'figure'),
-     Output('activity-level', 'children'), Output('activity-circle', 'figure'),
-     Output('regularity-level', 'children'), Output('regularity-circle', 'figure'),
-     Output('usage-dashboard-water', 'children'), Output('usage-dashboard-electricity', 'children'),
-     Output('usage-water-norm', 'children'), Output('usage-electricity-norm', 'children'),
-     Output('water-consumption', 'children'), Output('electricity-consumption', 'children')],
-    [Input('usage-picker-sidebar', 'value'), Input('date-picker-sidebar', 'date'),
-     Input('home-id-picker-sidebar', 'value')]
-)
-
-def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
+def update_usage_dashboard(selected_usage, selected_date, selected_home_id, compare_date=None, compare_home_id=None, fleet_bands=None):
+    fleet_bands = bool(fleet_bands)
+    if compare_date or compare_home_id:
+        outputs = render_usage_dashboard(selected_usage, selected_date, selected_home_id, compare_date, compare_home_id, fleet_bands)
+    else:
+        outputs = get_usage_dashboard(selected_usage, selected_date, selected_home_id, fleet_bands)
+    if selected_date and selected_home_id:
+        # Warm the neighbouring days so "<< Prev" / "Next >>" are served from cache
+        prefetch_adjacent(selected_date, selected_home_id)
+    return outputs
+
+# Figure cache in front of render_usage_dashboard. Outputs are cached only while
+# the day's data is in the data cache, i.e. for closed days that have data, and
+# concurrent misses for the same outputs are rendered once.
+def get_usage_dashboard(selected_usage, selected_date, selected_home_id, fleet_bands=False):
+    key = (selected_home_id, selected_date, selected_usage, fleet_bands)
+    outputs = get_cache('figure').get(key)
+    if outputs is None:
+        outputs = _figure_flight.do(key, build_usage_dashboard, selected_usage, selected_date, selected_home_id, fleet_bands)
+    return outputs
+
+# Render the dashboard outputs and cache them before coalesced waiters are released
+def build_usage_dashboard(selected_usage, selected_date, selected_home_id, fleet_bands=False):
+    outputs = render_usage_dashboard(selected_usage, selected_date, selected_home_id, fleet_bands=fleet_bands)
+    if (selected_home_id, selected_date) in get_cache('data'):
+        get_cache('figure').set((selected_home_id, selected_date, selected_usage, fleet_bands), outputs)
+    return outputs
+
+def render_usage_dashboard(selected_usage, selected_date, selected_home_id, compare_date=None, compare_home_id=None, fleet_bands=False):
+    from dash import dcc, html
+    import plotly.graph_objs as go
+
     if selected_date and selected_home_id:
         selected_date = datetime.strptime(selected_date, '%Y-%m-%d').strftime('%Y-%m-%d') 
                 
-        data = get_data_for_date_and_home(selected_date, selected_home_id)
+        # In compare mode both (date, home) pairs are fetched in one batched query per collection
+        compare_data = None
+        if compare_date or compare_home_id:
+            compare_date = compare_date or selected_date
+            compare_home_id = compare_home_id or selected_home_id
+            fetched = get_data_for_pairs([(selected_date, selected_home_id), (compare_date, compare_home_id)])
+            data = fetched.get((selected_date, selected_home_id))
+            compare_data = fetched.get((compare_date, compare_home_id))
+        else:
+            data = get_data_for_date_and_home(selected_date, selected_home_id)
         if data:
-            water_usage = data['water_usage'] 
-            water_usage_norm = data['water_norm']
-            water_active_score = data['water_active_score']
-            water_corr_coef = data['water_corr_coef']
-            water_norm_score = data['water_norm_score']
-            water_low_norm = data['water_low_norm']
-            water_high_norm = data['water_high_norm']
-            water_consumption = data['water_consumption']
-            
-            electricity_usage = data['electricity_usage']
-            electricity_usage_norm = data['electricity_norm']
-            electricity_active_score = data['electricity_active_score']
-            electricity_corr_coef = data['electricity_corr_coef']
-            electricity_norm_score = data['electricity_norm_score']
-            electricity_low_norm = data['electricity_low_norm']
-            electricity_high_norm = data['electricity_high_norm']
-            electricity_consumption = data['electricity_consumption']
+            water = data.water
+            electricity = data.electricity
 
             # Determine water levels and status
-            water_activity_level, water_activity_color = determine_activity_level(water_active_score, water_low_norm, water_norm_score, water_high_norm)
-            water_regularity_level, water_regularity_color = determine_regularity_level(water_corr_coef)
+            water_activity_level, water_activity_color = determine_activity_level(water.active_score, water.low_norm, water.norm_score, water.high_norm)
+            water_regularity_level, water_regularity_color = determine_regularity_level(water.corr_coef)
             water_status, water_status_color = determine_status(water_activity_level, water_regularity_level)
 
             # Determine electricity levels and status
-            electricity_activity_level, electricity_activity_color = determine_activity_level(electricity_active_score, electricity_low_norm, electricity_norm_score, electricity_high_norm)
-            electricity_regularity_level, electricity_regularity_color = determine_regularity_level(electricity_corr_coef)
+            electricity_activity_level, electricity_activity_color = determine_activity_level(electricity.active_score, electricity.low_norm, electricity.norm_score, electricity.high_norm)
+            electricity_regularity_level, electricity_regularity_color = determine_regularity_level(electricity.corr_coef)
             electricity_status, electricity_status_color = determine_status(electricity_activity_level, electricity_regularity_level)
 
             # Generate x-axis labels for time from 00:00 to 23:45 with 15-minute intervals
             x_labels = [f"{hour:02}:{minute:02}" for hour in range(0, 24) for minute in range(0, 60, 15)]
-            x_labels = x_labels[:len(water_usage)]  # Ensure labels match data length
+            x_labels = x_labels[:len(water.usage)]  # Ensure labels match data length
 
             # Custom status, activity, and regularity figures
             water_status_text = 'Status' #f'Status: {status}'
@@ -474,9 +637,9 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             water_usage_graph = dcc.Graph(
                 id='water-usage-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=water_usage, name='Water Usage')],
+                    data=[go.Bar(x=x_labels, y=water.usage.tolist(), name='Water Usage')],
                     layout=go.Layout(
-                        title=f'Active Score: {water_active_score} | Corr Coef: {water_corr_coef}', 
+                        title=f'Active Score: {water.active_score} | Corr Coef: {water.corr_coef}', 
                         xaxis={'title': 'Time', 'tickvals': x_labels, 'ticktext': x_labels}, 
                         yaxis={'title': 'Usage', 'range': [0, 1]},
                         # width='1200',
@@ -488,9 +651,9 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             water_usage_norm_graph = dcc.Graph(
                 id='water-usage-norm-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=water_usage_norm, name='Water Usage Norm')],
+                    data=[go.Bar(x=x_labels, y=water.norm.tolist(), name='Water Usage Norm')],
                     layout=go.Layout(
-                        title=f'Low: {water_low_norm} | Norm: {water_norm_score} | High: {water_high_norm}',
+                        title=f'Low: {water.low_norm} | Norm: {water.norm_score} | High: {water.high_norm}',
                         xaxis={'title': 'Time'}, 
                         yaxis={
                             'title': 'Usage Norm',
@@ -505,7 +668,7 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             water_consumption_graph = dcc.Graph(
                 id='water-consumption-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=water_consumption, name='Water consumption')],
+                    data=[go.Bar(x=x_labels, y=water.consumption.tolist(), name='Water consumption')],
                     layout=go.Layout(
                         title=f'Water consumption for Date: {selected_date}',
                         xaxis={'title': 'Time'}, 
@@ -549,9 +712,9 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             electricity_usage_graph = dcc.Graph(
                 id='electricity-usage-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=electricity_usage, name='Electricity Usage')],
+                    data=[go.Bar(x=x_labels, y=electricity.usage.tolist(), name='Electricity Usage')],
                     layout=go.Layout(
-                        title=f'Active Score: {electricity_active_score} | Corr Coef: {electricity_corr_coef}', 
+                        title=f'Active Score: {electricity.active_score} | Corr Coef: {electricity.corr_coef}', 
                         xaxis={'title': 'Time'}, 
                         yaxis={
                             'title': 'Usage',
@@ -620,9 +783,9 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             electricity_usage_norm_graph = dcc.Graph(
                 id='electricity-usage-norm-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=electricity_usage_norm, name='Electricity Usage Norm')],
+                    data=[go.Bar(x=x_labels, y=electricity.norm.tolist(), name='Electricity Usage Norm')],
                     layout=go.Layout(                            
-                        title=f'Low: {electricity_low_norm} | Norm: {electricity_norm_score} | High: {electricity_high_norm}',
+                        title=f'Low: {electricity.low_norm} | Norm: {electricity.norm_score} | High: {electricity.high_norm}',
                         xaxis={'title': 'Time'}, 
                         yaxis={
                             'title': 'Usage Norm',
@@ -637,7 +800,7 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
             electricity_consumption_graph = dcc.Graph(
                 id='electricity-consumption-graph',
                 figure=go.Figure(
-                    data=[go.Bar(x=x_labels, y=electricity_consumption, name='Electricity Consumption')],
+                    data=[go.Bar(x=x_labels, y=electricity.consumption.tolist(), name='Electricity Consumption')],
                     layout=go.Layout(                            
                         title=f'Electricity consumption for Date: {selected_date}',
                         xaxis={'title': 'Time'}, 
@@ -651,6 +814,24 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
                 )
             )
 
+            # Overlay the comparison day as extra traces on the usage, norm and consumption charts
+            if compare_data:
+                compare_name = f'{compare_home_id} {compare_date}'
+                for graph, series in [
+                    (water_usage_graph, compare_data.water.usage),
+                    (water_usage_norm_graph, compare_data.water.norm),
+                    (water_consumption_graph, compare_data.water.consumption),
+                    (electricity_usage_graph, compare_data.electricity.usage),
+                    (electricity_usage_norm_graph, compare_data.electricity.norm),
+                    (electricity_consumption_graph, compare_data.electricity.consumption)
+                ]:
+                    graph.figure.add_trace(go.Bar(x=x_labels, y=series.tolist(), name=compare_name))
+
+            # Fleet p10/p50/p90 per slot behind the selected utility's usage bars
+            if fleet_bands and selected_usage in ('water', 'electricity'):
+                graph = water_usage_graph if selected_usage == 'water' else electricity_usage_graph
+                graph.figure.add_traces(band_traces(get_fleet_bands(selected_usage, selected_date), x_labels))
+
             if selected_usage == 'water':
                 return (
                     water_status_text, water_status_rect_figure,
@@ -678,5 +859,110 @@ def update_usage_dashboard(selected_usage, selected_date, selected_home_id):
 
     return html.Div(), html.Div(), html.Div(), html.Div(), html.Div(), html.Div()
 
+
+# Wire the callbacks to an app instance. Dash sends the full callback list to
+# the browser once per page load, so every page's callbacks are registered up
+# front; a callback whose outputs are not on the open page never fires, and
+# the modules a page's callbacks need are imported on their first call.
+def register_callbacks(app):
+    from dash.dependencies import Input, Output, State
+
+    app.callback(
+        Output("collapse", "is_open"), Output("right-section", "width"),
+        [Input("toggle-button", "n_clicks")],
+        [State("collapse", "is_open"), State("right-section", "width")],
+    )(toggle_collapse)
+
+    app.callback(
+        Output('selected-info', 'children'),
+        [Input('home-id-picker-sidebar', 'value'), Input('date-picker-sidebar', 'date'), Input('usage-picker-sidebar', 'value')]
+    )(update_selected_info)
+
+    app.callback(
+        Output('date-picker-sidebar', 'date'),
+        Input('prev-day-button', 'n_clicks'),
+        Input('next-day-button', 'n_clicks'),
+        State('date-picker-sidebar', 'date')
+    )(update_selected_date)
+
+    app.callback(
+        [Output('status', 'children'), Output('status-rect', 'figure'),
+         Output('activity-level', 'children'), Output('activity-circle', 'figure'),
+         Output('regularity-level', 'children'), Output('regularity-circle', 'figure'),
+         Output('usage-dashboard-water', 'children'), Output('usage-dashboard-electricity', 'children'),
+         Output('usage-water-norm', 'children'), Output('usage-electricity-norm', 'children'),
+         Output('water-consumption', 'children'), Output('electricity-consumption', 'children')],
+        [Input('usage-picker-sidebar', 'value'), Input('date-picker-sidebar', 'date'),
+         Input('home-id-picker-sidebar', 'value'),
+         Input('compare-date-picker-sidebar', 'date'), Input('compare-home-id-picker-sidebar', 'value'),
+         Input('fleet-bands-sidebar', 'value')]
+    )(profiled(update_usage_dashboard))
+
+    app.callback(
+        Output('attention-list', 'children'),
+        Input('date-picker-sidebar', 'date')
+    )(update_attention_list)
+
+    app.callback(
+        Output('usage-heatmap', 'children'),
+        [Input('usage-picker-sidebar', 'value'), Input('date-picker-sidebar', 'date'),
+         Input('home-id-picker-sidebar', 'value'), Input('heatmap-picker', 'value')]
+    )(update_usage_heatmap)
+
+    app.callback(
+        Output('usage-trend', 'children'),
+        [Input('usage-picker-sidebar', 'value'), Input('home-id-picker-sidebar', 'value'),
+         Input('trend-picker', 'value')]
+    )(update_usage_trend)
+
+
+# App factory: load configuration, build the Dash app, its pages and callbacks
+def create_app():
+    import dash
+
+    get_settings()
+    # Pages are registered below rather than scanned from a folder. Callback
+    # validation is relaxed because only the open page's components exist.
+    app = dash.Dash(
+        __name__, external_stylesheets=static_assets.stylesheets(), title='Smart Meter Dashboard',
+        use_pages=True, pages_folder='', suppress_callback_exceptions=True
+    )
+    register_pages()
+    app.layout = build_layout
+    register_callbacks(app)
+    health.init_app(app.server)
+    export.init_app(app.server)
+    api.init_app(app.server)
+    metrics.init_app(app.server)
+    memory.init_app(app.server)
+    compression.init_app(app.server)
+    static_assets.init_app(app.server)
+    # Import the plotting stack before serving: numpy imported for the first
+    # time from concurrent request threads can be seen partially initialized
+    import numpy  # noqa: F401
+    import plotly.graph_objs  # noqa: F401
+    warmup.start()
+    return app
+
+
+# Return the process-wide app, creating it on first use
+def get_app():
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+
+# Keep `dash_app.app` and `dash_app.server` (e.g. for gunicorn) working lazily
+def __getattr__(name):
+    if name == 'app':
+        return get_app()
+    if name == 'server':
+        return get_app().server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    get_app().run_server(debug=True)
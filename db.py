@@ -0,0 +1,84 @@
+# 2026-10-18
+
+import os
+import threading
+
+# Environment variable holding the collection name for each data source
+COLLECTION_ENV = {
+    'water': 'MONGODB_COLLECTION',
+    'electricity': 'MONGODB_COLLECTION_ELECTRICITY',
+    'electr': 'MONGODB_COLLECTION_ELECTR',
+    'rollups': 'MONGODB_COLLECTION_ROLLUPS',
+    'jobs': 'MONGODB_COLLECTION_JOBS',
+    'status': 'MONGODB_COLLECTION_STATUS',
+    'cold': 'MONGODB_COLLECTION_COLD',
+}
+
+# Collections created by the dashboard's own jobs have default names
+COLLECTION_DEFAULTS = {
+    'rollups': 'usage_rollups',
+    'jobs': 'dashboard_jobs',
+    'status': 'home_status',
+    'cold': 'usage_cold',
+}
+
+# Where each utility's interval series and scores live in its collection.
+# Water documents are dated '%Y-%m-%d', electricity documents '%Y/%m/%d'.
+UTILITIES = {
+    'water': {
+        'date_format': '%Y-%m-%d',
+        'usage': 'usage', 'norm': 'four_week_usage_norm', 'consumption': 'water_consumption',
+    },
+    'electricity': {
+        'date_format': '%Y/%m/%d',
+        'usage': 'appliance_usage', 'norm': 'four_week_active_score', 'consumption': 'power',
+    },
+}
+SCORE_FIELDS = ['active_score', 'correlation_coefficient', 'low_norm', 'norm_active_score', 'high_norm']
+
+# Interval series hold one value per 15 minutes, labelled 00:00 to 23:45
+INTERVALS_PER_DAY = 96
+INTERVAL_LABELS = [f"{hour:02}:{minute:02}" for hour in range(0, 24) for minute in range(0, 60, 15)]
+
+_lock = threading.Lock()
+_settings = None
+_client = None
+
+
+# Load environment variables from .env file on first use, not at import time
+def get_settings():
+    global _settings
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                from dotenv import load_dotenv
+                load_dotenv('variables.env')
+                settings = {
+                    'MONGODB_URI': os.getenv("MONGODB_URI"),
+                    'MONGODB_DATABASE': os.getenv("MONGODB_DATABASE"),
+                }
+                for kind, env_name in COLLECTION_ENV.items():
+                    settings[env_name] = os.getenv(env_name, COLLECTION_DEFAULTS.get(kind))
+                _settings = settings
+    return _settings
+
+
+# Connect to MongoDB the first time a collection is needed
+def get_client():
+    global _client
+    if _client is None:
+        settings = get_settings()
+        with _lock:
+            if _client is None:
+                from pymongo import MongoClient
+                _client = MongoClient(settings['MONGODB_URI'])
+    return _client
+
+
+def get_db():
+    return get_client()[get_settings()['MONGODB_DATABASE']]
+
+
+# Resolve a collection by kind: 'water', 'electricity', 'electr', 'rollups', 'jobs', 'status' or 'cold'
+def get_collection(kind):
+    return get_db()[get_settings()[COLLECTION_ENV[kind]]]
@@ -0,0 +1,148 @@
+# 2026-10-18
+
+import csv
+import heapq
+import io
+from datetime import datetime
+
+from db import INTERVAL_LABELS, SCORE_FIELDS, UTILITIES
+from replica import get_analytics_storage
+
+COLUMNS = ['home_id', 'date', 'time', 'utility', 'usage', 'norm', 'consumption'] + SCORE_FIELDS
+
+
+# Yield (date, utility, document) for one utility over an inclusive date range,
+# streamed from the replica or storage backend so only one batch is held in memory.
+def _iter_documents(utility, home_id, start, end):
+    spec = UTILITIES[utility]
+    fields = [spec['usage'], spec['norm'], spec['consumption']] + SCORE_FIELDS
+    storage = get_analytics_storage(f'{end:%Y-%m-%d}', f'{start:%Y-%m-%d}')
+    for doc in storage.get_range(utility, home_id, f'{start:%Y-%m-%d}', f'{end:%Y-%m-%d}', fields):
+        yield doc['date'], utility, doc
+
+
+# Yield one row per 15-minute interval, water and electricity merged in date order
+def iter_interval_rows(home_id, start, end, utilities=('water', 'electricity')):
+    streams = [_iter_documents(utility, home_id, start, end) for utility in utilities]
+    for date, utility, doc in heapq.merge(*streams, key=lambda item: item[:2]):
+        spec = UTILITIES[utility]
+        usage = doc.get(spec['usage']) or []
+        norm = doc.get(spec['norm']) or []
+        consumption = doc.get(spec['consumption']) or []
+        scores = [doc.get(field) for field in SCORE_FIELDS]
+        for i in range(max(len(usage), len(norm), len(consumption))):
+            yield [
+                home_id, date, INTERVAL_LABELS[i] if i < len(INTERVAL_LABELS) else str(i), utility,
+                usage[i] if i < len(usage) else None,
+                norm[i] if i < len(norm) else None,
+                consumption[i] if i < len(consumption) else None,
+            ] + scores
+
+
+# Stream rows as CSV text in chunks of roughly `rows_per_chunk` rows
+def stream_csv(rows, rows_per_chunk=960):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Write-only file object that hands written bytes back to the caller. It keeps
+# its own position so the Parquet footer offsets stay correct after draining.
+class _DrainableSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# Stream rows as a Parquet file, one row group per `rows_per_group` rows
+def stream_parquet(rows, rows_per_group=96 * 31):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(name, pa.string()) for name in COLUMNS[:4]] + [(name, pa.float64()) for name in COLUMNS[4:]]
+    )
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    group = []
+
+    def write_group():
+        columns = list(zip(*group))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        ))
+        group.clear()
+
+    for row in rows:
+        group.append(row)
+        if len(group) >= rows_per_group:
+            write_group()
+            yield sink.drain()
+    if group:
+        write_group()
+    writer.close()
+    yield sink.drain()
+
+
+# GET /export?home_id=Home_2127&start=2024-01-01&end=2024-12-31&format=csv|parquet[&utility=water]
+def export_intervals():
+    from flask import Response, abort, request, stream_with_context
+
+    home_id = request.args.get('home_id')
+    fmt = request.args.get('format', 'csv')
+    utility = request.args.get('utility')
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', request.args['start']), '%Y-%m-%d')
+    except (KeyError, ValueError):
+        abort(400, "start and end must be given as YYYY-MM-DD")
+    if not home_id or end < start:
+        abort(400, "home_id is required and end must not be before start")
+    if utility and utility not in UTILITIES:
+        abort(400, f"utility must be one of {', '.join(UTILITIES)}")
+    utilities = (utility,) if utility else tuple(UTILITIES)
+
+    rows = iter_interval_rows(home_id, start, end, utilities)
+    filename = f"{home_id}_{start:%Y-%m-%d}_{end:%Y-%m-%d}"
+    if fmt == 'csv':
+        body, mimetype = stream_csv(rows), 'text/csv'
+    elif fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            abort(501, "Parquet export requires pyarrow")
+        body, mimetype = stream_parquet(rows), 'application/vnd.apache.parquet'
+    else:
+        abort(400, "format must be csv or parquet")
+
+    return Response(
+        stream_with_context(body), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+
+def init_app(server):
+    server.add_url_rule('/export', 'export_intervals', export_intervals)
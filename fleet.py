@@ -0,0 +1,92 @@
+# 2026-10-18
+
+from datetime import datetime
+import json
+import warnings
+
+from cache import get_cache
+from db import INTERVALS_PER_DAY, UTILITIES
+from replica import get_analytics_storage
+from singleflight import SingleFlight
+
+PERCENTILES = (10, 50, 90)
+
+_flight = SingleFlight('fleet')
+
+
+# Per-slot fleet percentiles of one utility's usage series from {home_id: doc}.
+# Returns (number of homes, 3 x 96 array of p10/p50/p90); slots no home
+# reported stay NaN.
+def fleet_bands(docs, utility):
+    import numpy as np
+
+    field = UTILITIES[utility]['usage']
+    matrix = np.full((max(len(docs), 1), INTERVALS_PER_DAY), np.nan)
+    homes = 0
+    for doc in docs.values():
+        values = (doc.get(field) or [])[:INTERVALS_PER_DAY]
+        if values:
+            matrix[homes, :len(values)] = np.asarray([np.nan if v is None else v for v in values], dtype=float)
+            homes += 1
+    with warnings.catch_warnings():
+        # All-NaN slots are expected for days the fleet only partly reported
+        warnings.simplefilter('ignore', RuntimeWarning)
+        bands = np.nanpercentile(matrix[:max(homes, 1)], PERCENTILES, axis=0)
+    return homes, bands
+
+
+# JSON form of fleet_bands() output for the shared cache; NaN slots become null
+def bands_to_json(bands):
+    homes, values = bands
+    return json.dumps({'homes': homes, 'bands': [[None if v != v else v for v in row] for row in values.tolist()]})
+
+
+def bands_from_json(text):
+    import numpy as np
+
+    payload = json.loads(text)
+    return payload['homes'], np.array([[np.nan if v is None else v for v in row] for row in payload['bands']])
+
+
+# Cache the bands of a closed day computed from documents already loaded,
+# e.g. by the cache warm-up. A day no home has reported yet (the scoring job
+# has not run) is not cached.
+def store_fleet_bands(utility, date, docs):
+    bands = fleet_bands(docs, utility)
+    if bands[0] and date < datetime.now().strftime('%Y-%m-%d'):
+        get_cache('fleet').set((utility, date), bands)
+    return bands
+
+
+def _load_fleet_bands(utility, date):
+    return store_fleet_bands(utility, date, get_analytics_storage(date).get_date(utility, date))
+
+
+# Bands for every home on `date`, computed once per day and utility and cached
+def get_fleet_bands(utility, date):
+    bands = get_cache('fleet').get((utility, date))
+    if bands is None:
+        bands = _flight.do((utility, date), _load_fleet_bands, utility, date)
+    return bands
+
+
+# Shaded p10-p90 band and a dashed median line for a usage chart
+def band_traces(bands, x_labels):
+    import plotly.graph_objs as go
+
+    homes, (p10, p50, p90) = bands
+    slots = len(x_labels)
+    return [
+        go.Scatter(
+            x=x_labels, y=p10[:slots].tolist(), name='Fleet p10',
+            mode='lines', line={'width': 0}, showlegend=False
+        ),
+        go.Scatter(
+            x=x_labels, y=p90[:slots].tolist(), name=f'Fleet p10-p90 ({homes} homes)',
+            mode='lines', line={'width': 0}, fill='tonexty', fillcolor='rgba(128, 128, 128, 0.25)'
+        ),
+        go.Scatter(
+            x=x_labels, y=p50[:slots].tolist(), name='Fleet median',
+            mode='lines', line={'color': 'dimgray', 'dash': 'dash'}
+        ),
+    ]
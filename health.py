@@ -0,0 +1,66 @@
+# 2026-10-18
+
+import os
+import threading
+import time
+
+from cache import cache_stats
+from db import get_client
+from storage import get_storage
+import warmup
+
+# Cached result of the last MongoDB ping, so frequent probes don't hit the database
+_ping_lock = threading.Lock()
+_ping = {'ok': None, 'error': None, 'checked_at': 0.0}
+
+
+# Ping MongoDB at most once per READYZ_PING_TTL seconds; concurrent probes
+# reuse the last result instead of queueing behind an in-flight ping.
+def mongo_status():
+    ttl = float(os.getenv("READYZ_PING_TTL", "10"))
+    if time.monotonic() - _ping['checked_at'] > ttl and _ping_lock.acquire(blocking=False):
+        try:
+            import pymongo
+            with pymongo.timeout(float(os.getenv("READYZ_PING_TIMEOUT", "2"))):
+                get_client().admin.command('ping')
+            _ping.update(ok=True, error=None)
+        except Exception as e:
+            _ping.update(ok=False, error=str(e))
+        finally:
+            _ping['checked_at'] = time.monotonic()
+            _ping_lock.release()
+    return {
+        'ok': bool(_ping['ok']),
+        'error': _ping['error'],
+        'age_seconds': round(time.monotonic() - _ping['checked_at'], 1),
+    }
+
+
+# Liveness: the worker is up and serving requests
+def healthz():
+    from flask import jsonify
+    return jsonify(status='ok')
+
+
+# Readiness: MongoDB is reachable when it is the storage backend and, if
+# READYZ_REQUIRE_WARM is set, the data cache is warm
+def readyz():
+    from flask import jsonify
+    if get_storage().name == 'mongo':
+        mongo = mongo_status()
+    else:
+        mongo = {'ok': True, 'error': None, 'skipped': True}
+    caches = cache_stats()
+    warm = caches.get('data', {}).get('size', 0) > 0
+    ready = mongo['ok'] and (warm or os.getenv("READYZ_REQUIRE_WARM", "") == "")
+    body = {
+        'status': 'ready' if ready else 'unavailable', 'mongo': mongo,
+        'cache_warm': warm, 'caches': caches, 'warmup': warmup.last_run,
+    }
+    return jsonify(body), 200 if ready else 503
+
+
+# Register the probe routes on the Flask server behind the Dash app
+def init_app(server):
+    server.add_url_rule('/healthz', 'healthz', healthz)
+    server.add_url_rule('/readyz', 'readyz', readyz)
@@ -0,0 +1,63 @@
+# 2026-10-18
+
+from datetime import datetime, timedelta
+
+from cache import get_cache
+from db import INTERVAL_LABELS, INTERVALS_PER_DAY, UTILITIES
+from replica import get_analytics_storage
+
+MAX_DAYS = 366
+
+
+# Load one utility series for a home over `days` days ending at `end` into a
+# preallocated (days x 96) matrix with a single projected range scan. Days
+# without a document stay NaN, which the heatmap draws as gaps.
+def build_usage_matrix(home_id, utility, end, days=365, series='consumption'):
+    import numpy as np
+
+    days = max(1, min(days, MAX_DAYS))
+    start = end - timedelta(days=days - 1)
+    field = UTILITIES[utility][series]
+
+    matrix = np.full((days, INTERVALS_PER_DAY), np.nan)
+    docs = get_analytics_storage(f'{end:%Y-%m-%d}', f'{start:%Y-%m-%d}').get_range(
+        utility, home_id, f'{start:%Y-%m-%d}', f'{end:%Y-%m-%d}', [field]
+    )
+    for doc in docs:
+        row = (datetime.strptime(doc['date'], '%Y-%m-%d') - start).days
+        values = (doc.get(field) or [])[:INTERVALS_PER_DAY]
+        if 0 <= row < days and values:
+            matrix[row, :len(values)] = np.asarray(values, dtype=float)
+
+    dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    return dates, matrix
+
+
+# Cached matrix per (home, utility, end date, days); only closed ranges are cached
+def get_usage_matrix(home_id, utility, end, days=365, series='consumption'):
+    key = (home_id, utility, end.strftime('%Y-%m-%d'), days, series)
+    cache = get_cache('heatmap')
+    result = cache.get(key)
+    if result is None:
+        result = build_usage_matrix(home_id, utility, end, days, series)
+        if end.date() < datetime.now().date():
+            cache.set(key, result)
+    return result
+
+
+# One go.Heatmap trace: dates along x, time of day along y
+def heatmap_figure(dates, matrix, title):
+    import plotly.graph_objs as go
+
+    return go.Figure(
+        data=[go.Heatmap(
+            x=dates, y=INTERVAL_LABELS, z=matrix.T,
+            colorscale='Blues', hoverongaps=False, colorbar={'title': 'Consumption'}
+        )],
+        layout=go.Layout(
+            title=title,
+            xaxis={'title': 'Date'},
+            yaxis={'title': 'Time', 'autorange': 'reversed', 'nticks': 13},
+            height=500
+        )
+    )
@@ -0,0 +1,283 @@
+# 2026-10-18
+#
+# Bulk ingestion of meter readings.
+#
+#   python ingest.py water readings.csv
+#   python ingest.py electricity export.jsonl.gz --batch-size 2000 --writers 4
+#
+# Streams CSV or JSON-lines exports (optionally gzipped) with one reading per
+# row, assembles 96-slot daily documents and upserts them with unordered
+# bulk_write batches. Each row needs:
+#
+#   home_id                        'Home_2127', 'home2127', 'HOME-2127' ... are all stored as 'Home_2127'
+#   date + time, or timestamp      '%Y-%m-%d' or '%Y/%m/%d'; time 'HH:MM' (or an 'interval' 0-95)
+#   one or more series columns     e.g. usage / water_consumption for water,
+#                                  appliance_usage / power for electricity
+#
+# Any other numeric column is stored as a day-level value (last one wins).
+# Days are written once all 96 slots are filled, or at the end of the input;
+# exports grouped by home and day therefore keep only a few days in memory.
+# A day with unreported slots only writes the slots it has, so partial days
+# and rows arriving after their day was written merge into the stored arrays.
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from datetime import datetime
+import gzip
+import json
+import re
+import sys
+import time
+
+from cache import invalidate_days
+from db import INTERVALS_PER_DAY, UTILITIES, get_collection
+
+DAY_INDEX = [('home_id', 1), ('date', 1)]
+# Server error codes for an index on the same keys with other options, and for
+# documents that break a unique index
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY_CODE = 11000
+DUPLICATE_DAYS = [
+    {'$group': {'_id': {'home_id': '$home_id', 'date': '$date'}, 'count': {'$sum': 1}}},
+    {'$match': {'count': {'$gt': 1}}},
+    {'$limit': 1},
+]
+DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d']
+RESERVED_COLUMNS = {'home_id', 'date', 'time', 'timestamp', 'interval', 'utility', '_id'}
+HOME_ID_PATTERN = re.compile(r'^home[\s_-]*(\d+)$', re.IGNORECASE)
+
+
+# 'home2127', 'HOME-2127' and 'Home_2127' all become 'Home_2127'
+def normalize_home_id(value):
+    value = str(value).strip()
+    match = HOME_ID_PATTERN.match(value)
+    return f'Home_{match.group(1)}' if match else value
+
+
+# Parse any accepted date (or the date part of a timestamp) into a date object
+def parse_date(value):
+    value = str(value).strip()[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date: {value!r}")
+
+
+# 15-minute slot (0-95) of a row, from 'interval', 'time' or the timestamp's time part
+def parse_slot(row):
+    if row.get('interval') not in (None, ''):
+        slot = int(row['interval'])
+    else:
+        clock = str(row.get('time') or str(row.get('timestamp', ''))[11:16])
+        hour, minute = clock.strip().split(':')[:2]
+        slot = int(hour) * 4 + int(minute) // 15
+    if not 0 <= slot < INTERVALS_PER_DAY:
+        raise ValueError(f"interval out of range: {slot}")
+    return slot
+
+
+def _number(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+
+# Yield rows as dicts from a CSV or JSON-lines file
+def read_rows(path, fmt=None):
+    fmt = fmt or ('jsonl' if re.search(r'\.(jsonl|ndjson|json)(\.gz)?$', path) else 'csv')
+    with open_input(path) as handle:
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _series_fields(utility):
+    spec = UTILITIES[utility]
+    return {spec['usage'], spec['norm'], spec['consumption']}
+
+
+# Assemble rows into daily documents. Yields (home_id, date, fields) as soon as a
+# day has all 96 slots, and the remaining partial days at the end of the input.
+def assemble_days(rows, utility, stats):
+    series_fields = _series_fields(utility)
+    pending = {}
+    filled = {}
+
+    for row in rows:
+        stats['rows'] += 1
+        try:
+            home_id = normalize_home_id(row['home_id'])
+            day = parse_date(row.get('date') or row['timestamp'])
+            slot = parse_slot(row)
+        except (KeyError, ValueError) as e:
+            stats['rejected'] += 1
+            if stats['rejected'] <= 10:
+                print(f"Skipping row {stats['rows']}: {e}")
+            continue
+
+        key = (home_id, day)
+        fields = pending.get(key)
+        if fields is None:
+            fields = pending[key] = {}
+            filled[key] = set()
+        for column, value in row.items():
+            if column in RESERVED_COLUMNS or value in (None, ''):
+                continue
+            if column in series_fields:
+                try:
+                    number = _number(value)
+                except (TypeError, ValueError):
+                    stats['bad_values'] += 1
+                    if stats['rejected'] + stats['bad_values'] <= 10:
+                        print(f"Skipping {column} value {value!r} in row {stats['rows']}")
+                    continue
+                fields.setdefault(column, [None] * INTERVALS_PER_DAY)[slot] = number
+            else:
+                try:
+                    fields[column] = _number(value)
+                except (TypeError, ValueError):
+                    fields[column] = value
+        filled[key].add(slot)
+
+        if len(filled[key]) == INTERVALS_PER_DAY:
+            del filled[key]
+            yield home_id, day, pending.pop(key)
+
+    for (home_id, day), fields in pending.items():
+        stats['partial_days'] += 1
+        yield home_id, day, fields
+
+
+# One document per home and day. The non-unique index older deployments have
+# is replaced, but only once no day has two documents: dropping it and then
+# failing on duplicates would leave the dashboard's reads without an index.
+def ensure_indexes(collection):
+    from pymongo.errors import OperationFailure
+
+    try:
+        collection.create_index(DAY_INDEX, unique=True)
+        return
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES + (DUPLICATE_KEY_CODE,):
+            raise
+        error = e
+    duplicate = next(collection.aggregate(DUPLICATE_DAYS, allowDiskUse=True), None)
+    if duplicate is not None:
+        raise ValueError(
+            f"{collection.name} has {duplicate['count']} documents for {duplicate['_id']['home_id']} on "
+            f"{duplicate['_id']['date']}; merge duplicate days before ingesting"
+        ) from error
+    if error.code == DUPLICATE_KEY_CODE:
+        raise error
+    collection.drop_index(DAY_INDEX)
+    collection.create_index(DAY_INDEX, unique=True)
+
+
+# Updates writing one assembled day. Complete series replace the stored arrays;
+# otherwise only the reported slots are set ('usage.17'), after making sure the
+# document and its arrays exist so the dotted paths index into arrays.
+def day_updates(home_id, date, fields, series_fields):
+    from pymongo import UpdateOne
+
+    key = {'home_id': home_id, 'date': date}
+    series = [column for column in fields if column in series_fields]
+    if all(None not in fields[column] for column in series):
+        return [UpdateOne(key, {'$set': dict(fields, **key)}, upsert=True)]
+
+    empty = {column: [None] * INTERVALS_PER_DAY for column in series}
+    updates = [UpdateOne(key, {'$setOnInsert': empty}, upsert=True)]
+    # {column: None} would also match arrays holding a None, i.e. any partial day
+    updates += [
+        UpdateOne(dict(key, **{column: {'$not': {'$type': 'array'}}}), {'$set': {column: empty[column]}})
+        for column in series
+    ]
+    values = {column: value for column, value in fields.items() if column not in series}
+    for column in series:
+        values.update((f'{column}.{slot}', value) for slot, value in enumerate(fields[column]) if value is not None)
+    updates.append(UpdateOne(key, {'$set': values}))
+    return updates
+
+
+# Upsert assembled days in batches, spread over `writers` threads. Batches are
+# unordered unless they hold a partial day, whose updates must apply in turn.
+# Cached copies of the written days are invalidated batch by batch.
+def ingest(rows, utility, batch_size=1000, writers=2):
+    collection = get_collection(utility)
+    ensure_indexes(collection)
+    date_format = UTILITIES[utility]['date_format']
+    series_fields = _series_fields(utility)
+    stats = {
+        'rows': 0, 'rejected': 0, 'bad_values': 0, 'days': 0, 'partial_days': 0, 'upserted': 0, 'modified': 0
+    }
+
+    def write(batch, days, ordered):
+        result = collection.bulk_write(batch, ordered=ordered)
+        invalidate_days(days)
+        return result
+
+    def collect(future):
+        result = future.result()
+        stats['upserted'] += result.upserted_count
+        stats['modified'] += result.modified_count
+
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        in_flight = []
+        batch, days, ordered = [], [], False
+        for home_id, day, fields in assemble_days(rows, utility, stats):
+            updates = day_updates(home_id, day.strftime(date_format), fields, series_fields)
+            batch.extend(updates)
+            ordered = ordered or len(updates) > 1
+            days.append((home_id, day.strftime('%Y-%m-%d')))
+            stats['days'] += 1
+            if len(batch) >= batch_size:
+                in_flight.append(executor.submit(write, batch, days, ordered))
+                batch, days, ordered = [], [], False
+                # Keep at most two batches queued per writer so memory stays bounded
+                while len(in_flight) > writers * 2:
+                    collect(in_flight.pop(0))
+        if batch:
+            in_flight.append(executor.submit(write, batch, days, ordered))
+        for future in in_flight:
+            collect(future)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load meter readings into daily documents")
+    parser.add_argument('utility', choices=list(UTILITIES))
+    parser.add_argument('paths', nargs='+', help="CSV or JSON-lines files ('-' for stdin, .gz accepted)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="input format, detected from the file name by default")
+    parser.add_argument('--batch-size', type=int, default=1000, help="documents per bulk_write (default 1000)")
+    parser.add_argument('--writers', type=int, default=2, help="concurrent bulk_write calls (default 2)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    rows = (row for path in args.paths for row in read_rows(path, args.format))
+    try:
+        stats = ingest(rows, args.utility, args.batch_size, args.writers)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    elapsed = time.monotonic() - started
+    print(
+        f"{stats['rows']} rows ({stats['rejected']} rejected, {stats['bad_values']} bad values) -> {stats['days']} days "
+        f"({stats['partial_days']} partial), {stats['upserted']} inserted, {stats['modified']} updated "
+        f"in {elapsed:.1f}s ({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+
+
+if __name__ == '__main__':
+    main()
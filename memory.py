@@ -0,0 +1,153 @@
+# 2026-10-18
+#
+# Memory accounting for a dashboard worker.
+#
+#   MEMORY_BUDGET_MB   bytes all caches together may hold; past it the least
+#                      recently used figures, heatmaps and then days are evicted
+#                      (see cache.enforce_memory_budget). Unset or 0: unbounded.
+#   MEMORY_DEBUG=1     serve GET /debug/memory (tracemalloc snapshots on demand)
+#   TRACEMALLOC_FRAMES frames kept per allocation when tracing (default 1)
+#
+# Cache sizes, the budget, the resident set size and tracemalloc totals are
+# exported as gauges on /metrics.
+
+import os
+import sys
+import threading
+
+import metrics
+
+_ATOMIC = (str, bytes, int, float, bool, complex, type(None))
+
+_snapshot_lock = threading.Lock()
+_last_snapshot = None
+
+
+# Approximate deep size of a cached value in bytes. Dash components and plotly
+# figures are measured through their JSON form, which is what they hold and
+# avoids walking shared validators; packed arrays report their own buffers.
+def deep_sizeof(obj, seen=None):
+    # id -> object, so temporaries from to_plotly_json() stay alive and their ids unique
+    seen = {} if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen[id(obj)] = obj
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMIC) or type(obj).__module__ == 'array':
+        return size
+    # numpy only includes the buffer in getsizeof when the array owns it
+    if type(obj).__module__ == 'numpy':
+        return size + (obj.nbytes if getattr(obj, 'base', None) is not None else 0)
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, 'to_plotly_json'):
+        return size + deep_sizeof(obj.to_plotly_json(), seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_sizeof(getattr(obj, name), seen)
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def memory_budget():
+    return int(float(os.getenv("MEMORY_BUDGET_MB", "0")) * 1024 * 1024)
+
+
+# Current resident set size of the process, or None where /proc is unavailable
+def resident_memory():
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Refresh the memory gauges; runs on every /metrics scrape
+def collect():
+    import tracemalloc
+    from cache import cache_stats
+
+    for name, stats in cache_stats().items():
+        metrics.set_gauge('cache_bytes', stats['bytes'], cache=name)
+        metrics.set_gauge('cache_entries', stats['size'], cache=name)
+    metrics.set_gauge('cache_memory_budget_bytes', memory_budget())
+    rss = resident_memory()
+    if rss is not None:
+        metrics.set_gauge('process_resident_memory_bytes', rss)
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        metrics.set_gauge('tracemalloc_traced_bytes', current)
+        metrics.set_gauge('tracemalloc_peak_bytes', peak)
+
+
+# Top allocation sites of a new snapshot, and the growth since the previous one
+def snapshot_report(top=25):
+    import tracemalloc
+
+    global _last_snapshot
+
+    with _snapshot_lock:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        previous, _last_snapshot = _last_snapshot, snapshot
+
+    report = {'top': [
+        {'site': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:top]
+    ]}
+    if previous is not None:
+        report['growth'] = [
+            {'site': str(stat.traceback), 'bytes': stat.size, 'bytes_diff': stat.size_diff, 'count_diff': stat.count_diff}
+            for stat in snapshot.compare_to(previous, 'lineno')[:top]
+        ]
+    return report
+
+
+# GET /debug/memory[?trace=start|stop][&top=N]
+# Without tracing this reports cache bytes and RSS only; once tracing is started
+# each call returns a snapshot and the growth since the previous call.
+def memory_view():
+    import tracemalloc
+    from flask import jsonify, request
+    from cache import cache_stats
+
+    global _last_snapshot
+
+    trace = request.args.get('trace')
+    if trace == 'start' and not tracemalloc.is_tracing():
+        tracemalloc.start(int(os.getenv("TRACEMALLOC_FRAMES", "1")))
+    elif trace == 'stop' and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _last_snapshot = None
+
+    body = {
+        'resident_bytes': resident_memory(),
+        'budget_bytes': memory_budget(),
+        'caches': cache_stats(),
+        'tracing': tracemalloc.is_tracing(),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        body.update(traced_bytes=current, traced_peak_bytes=peak)
+        body.update(snapshot_report(int(request.args.get('top', '25'))))
+    return jsonify(body)
+
+
+def init_app(server):
+    metrics.describe('cache_bytes', "Approximate bytes held by each cache")
+    metrics.describe('cache_entries', "Entries in each cache")
+    metrics.describe('cache_memory_budget_bytes', "MEMORY_BUDGET_MB in bytes, 0 when unbounded")
+    metrics.describe('cache_budget_evictions_total', "Entries evicted to stay within the memory budget")
+    metrics.describe('shared_cache_evictions_total', "Entries evicted from the node-wide shared cache to stay within SHARED_CACHE_MB")
+    metrics.describe('process_resident_memory_bytes', "Resident set size of the worker")
+    metrics.describe('tracemalloc_traced_bytes', "Memory traced by tracemalloc while it is running")
+    metrics.describe('tracemalloc_peak_bytes', "Peak memory traced by tracemalloc")
+    metrics.register_collector(collect)
+    if os.getenv("MEMORY_DEBUG", "") == "1":
+        server.add_url_rule('/debug/memory', 'debug_memory', memory_view)
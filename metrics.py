@@ -0,0 +1,74 @@
+# 2026-10-18
+
+import threading
+
+_lock = threading.Lock()
+# (name, sorted label items) -> value
+_counters = {}
+_gauges = {}
+_help = {}
+# Functions run before each render, e.g. to refresh gauges sampled on scrape
+_collectors = []
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+# Add `value` to a counter, e.g. inc('compression_bytes_in_total', 512, encoding='gzip')
+def inc(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _gauges[key] = value
+
+
+def register_collector(func):
+    if func not in _collectors:
+        _collectors.append(func)
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters), dict(_gauges)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+# Render all metrics in the Prometheus text exposition format
+def render():
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    counters, gauges = snapshot()
+    lines = []
+    for kind, values in (('counter', counters), ('gauge', gauges)):
+        for name in sorted({name for name, _ in values}):
+            if name in _help:
+                lines.append(f'# HELP {name} {_help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# GET /metrics
+def metrics_view():
+    from flask import Response
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(server):
+    server.add_url_rule('/metrics', 'metrics', metrics_view)
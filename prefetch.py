@@ -0,0 +1,67 @@
+# 2026-10-18
+
+from datetime import datetime, timedelta
+import os
+import threading
+
+from cache import get_cache
+
+_lock = threading.Lock()
+_executor = None
+# (home_id, date displayed) -> futures prefetching that date's neighbours
+_pending = {}
+_inflight = set()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PREFETCH_WORKERS", "2")), thread_name_prefix='prefetch'
+        )
+    return _executor
+
+
+# Fetch one day into the data cache unless the user has moved on from `center`
+def _prefetch(date, home_id, center):
+    from dash_app import get_data_for_date_and_home
+
+    with _lock:
+        if (home_id, center) not in _pending or (home_id, date) in _inflight:
+            return
+        _inflight.add((home_id, date))
+    try:
+        get_data_for_date_and_home(date, home_id)
+    finally:
+        with _lock:
+            _inflight.discard((home_id, date))
+
+
+# Prefetch D-1 and D+1 for the home being viewed at D. Stepping to D from D-1
+# or D+1 cancels the prefetches queued for that day (ones already running are
+# skipped when they start); views of the same home at other dates, e.g. a
+# colleague looking at another day, keep theirs. Set PREFETCH_ADJACENT=0 to
+# disable.
+def prefetch_adjacent(date, home_id):
+    if os.getenv("PREFETCH_ADJACENT", "1") == "0":
+        return
+    center = datetime.strptime(date, '%Y-%m-%d')
+    today = datetime.now().strftime('%Y-%m-%d')
+    cache = get_cache('data')
+    targets = [
+        day for day in ((center + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in (-1, 1))
+        if day < today and (home_id, day) not in cache
+    ]
+
+    stepped_from = [(home_id, (center + timedelta(days=offset)).strftime('%Y-%m-%d')) for offset in (-1, 1)]
+
+    with _lock:
+        for key in stepped_from:
+            for future in _pending.pop(key, ()):
+                future.cancel()
+        for key in [key for key, futures in _pending.items() if all(future.done() for future in futures)]:
+            del _pending[key]
+        executor = _get_executor()
+        futures = [executor.submit(_prefetch, day, home_id, date) for day in targets]
+        _pending[(home_id, date)] = _pending.get((home_id, date), []) + futures
@@ -0,0 +1,71 @@
+# 2026-10-18
+
+import cProfile
+import functools
+import hmac
+import os
+import re
+import time
+
+# Header that asks for a profile of a single request when PROFILE_REQUESTS=header
+PROFILE_HEADER = 'X-Dash-Profile'
+
+
+# Decide at decoration time whether to wrap the callback, so a disabled profiler
+# leaves the original function in place and costs nothing per request.
+#   PROFILE_REQUESTS=all     profile every call
+#   PROFILE_REQUESTS=header  profile only requests whose X-Dash-Profile header
+#                            equals PROFILE_TOKEN; without a token the header is
+#                            ignored, so visitors cannot make the server profile
+def profiled(func):
+    mode = os.getenv("PROFILE_REQUESTS", "").strip().lower()
+    token = os.getenv("PROFILE_TOKEN", "")
+    if mode not in ('all', 'header') or (mode == 'header' and not token):
+        return func
+
+    profile_dir = os.getenv("PROFILE_DIR", "profiles")
+    keep = int(os.getenv("PROFILE_KEEP", "50"))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if mode == 'header' and not _profile_requested(token):
+            return func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            _write_profile(profiler, profile_dir, keep, func.__name__, args)
+
+    return wrapper
+
+
+def _profile_requested(token):
+    from flask import has_request_context, request
+    if not has_request_context():
+        return False
+    return hmac.compare_digest(request.headers.get(PROFILE_HEADER, '').encode(), token.encode())
+
+
+# Write one pstats file per request, named after the callback and its inputs
+# (e.g. home and date) so a slow view can be found again, then rotate old files.
+def _write_profile(profiler, profile_dir, keep, name, args):
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9-]+', '_', '_'.join(str(a) for a in args))[:80]
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f'-{time.time_ns() % 1_000_000_000:09d}'
+        path = os.path.join(profile_dir, f'{stamp}_{name}_{slug}.prof')
+        profiler.dump_stats(path)
+        _rotate_profiles(profile_dir, keep)
+    except OSError as e:
+        print(f"Error writing profile: {e}")
+
+
+# Keep only the newest `keep` profiles; file names start with their timestamp
+def _rotate_profiles(profile_dir, keep):
+    files = sorted((f for f in os.listdir(profile_dir) if f.endswith('.prof')), reverse=True)
+    for name in files[keep:]:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except OSError:
+            pass
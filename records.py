@@ -0,0 +1,96 @@
+# 2026-10-18
+
+from array import array
+from dataclasses import dataclass
+import math
+
+from db import UTILITIES
+
+# Interval series on a UtilityDay; the source field per utility is in db.UTILITIES
+SERIES_ATTRIBUTES = ('usage', 'norm', 'consumption')
+
+# UtilityDay score attribute -> field in the daily document
+SCORE_ATTRIBUTES = {
+    'active_score': 'active_score',
+    'corr_coef': 'correlation_coefficient',
+    'low_norm': 'low_norm',
+    'norm_score': 'norm_active_score',
+    'high_norm': 'high_norm',
+}
+
+
+# Series are stored as packed doubles (missing readings as NaN) rather than
+# lists of float objects, which keeps a cached day at roughly a quarter of the size.
+def _series(values):
+    return array('d', (math.nan if value is None else value for value in values or ()))
+
+
+def _series_list(values):
+    return [None if math.isnan(value) else value for value in values]
+
+
+# One utility's day: three 96-slot series and the day's scores (rounded to 3 places).
+# A utility without a document is an instance with empty series and zero scores.
+@dataclass
+class UtilityDay:
+    __slots__ = ('usage', 'norm', 'consumption', 'active_score', 'corr_coef', 'low_norm', 'norm_score', 'high_norm')
+    usage: array
+    norm: array
+    consumption: array
+    active_score: float
+    corr_coef: float
+    low_norm: float
+    norm_score: float
+    high_norm: float
+
+    @classmethod
+    def from_document(cls, doc, utility):
+        spec = UTILITIES[utility]
+        doc = doc or {}
+        fields = {name: _series(doc.get(spec[name])) for name in SERIES_ATTRIBUTES}
+        fields.update({name: round(doc.get(field) or 0.0, 3) for name, field in SCORE_ATTRIBUTES.items()})
+        return cls(**fields)
+
+    def __bool__(self):
+        return len(self.usage) > 0
+
+
+# Everything the dashboard shows for one home and date
+@dataclass
+class DayRecord:
+    __slots__ = ('water', 'electricity')
+    water: UtilityDay
+    electricity: UtilityDay
+
+    @classmethod
+    def from_documents(cls, water_doc, electricity_doc):
+        return cls(
+            water=UtilityDay.from_document(water_doc, 'water'),
+            electricity=UtilityDay.from_document(electricity_doc, 'electricity'),
+        )
+
+    def has_data(self):
+        return bool(self.water or self.electricity)
+
+    # Inverse of to_dict(), e.g. for a day read back from the shared cache
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{
+            utility: UtilityDay(**{
+                name: _series(values[f'{utility}_{name}']) if name in SERIES_ATTRIBUTES else values[f'{utility}_{name}']
+                for name in UtilityDay.__slots__
+            })
+            for utility in UTILITIES
+        })
+
+    # The flat dict previously returned by get_data_for_date_and_home, e.g.
+    # {'water_usage': [...], 'water_active_score': 0.5, ..., 'electricity_high_norm': 0.8}
+    def to_dict(self):
+        result = {}
+        for utility in UTILITIES:
+            day = getattr(self, utility)
+            for name in SERIES_ATTRIBUTES:
+                result[f'{utility}_{name}'] = _series_list(getattr(day, name))
+            for name in SCORE_ATTRIBUTES:
+                result[f'{utility}_{name}'] = getattr(day, name)
+        return result
@@ -0,0 +1,197 @@
+# 2026-10-18
+#
+# Local analytical replica of the water and electricity collections, so heavy
+# scans (date ranges, rollups, fleet-wide days) stay off the MongoDB instance
+# that serves interactive reads.
+#
+#   python replica.py sync                        # copy what changed since the last sync
+#   python replica.py sync --since 2023-01-01     # re-copy everything from a date (backfills)
+#
+# The replica is an SQLite file (REPLICA_PATH) holding the same `days` table as
+# STORAGE_BACKEND=sqlite plus a narrow `day_totals` table that rollups are
+# grouped from. Each sync starts REPLICA_OVERLAP_DAYS (default 3) before the
+# stored watermark so days rescored after they were first copied are picked up.
+#
+# With REPLICA_PATH set, range, rollup and fleet views read the replica for
+# dates before its newest synced day and fall back to the primary storage
+# otherwise; get_data_for_date_and_home always reads the primary storage.
+# The replica copies only the hot collections, so ranges reaching back past
+# the retention cutoff (days retention.py moved to the cold tier) also read
+# the primary storage, whose TieredStorage serves both tiers.
+
+import argparse
+from datetime import datetime, timedelta
+import os
+import threading
+
+from db import UTILITIES, get_collection, get_settings
+from storage import SQLiteStorage, get_storage, retention_cutoff
+
+# Rollup period start for each granularity; weeks start on Monday as in rollups.py
+PERIOD_SQL = {
+    'day': "date",
+    'week': "date(date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', date)",
+}
+
+_lock = threading.Lock()
+_replica = None
+
+
+def _total(values):
+    values = [value for value in values or [] if value is not None]
+    return sum(values) if values else None
+
+
+class ReplicaStorage(SQLiteStorage):
+    name = 'replica'
+
+    SCHEMA = SQLiteStorage.SCHEMA + """
+        CREATE TABLE IF NOT EXISTS day_totals (
+            utility TEXT NOT NULL,
+            home_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            usage_total REAL,
+            consumption_total REAL,
+            active_score REAL,
+            correlation_coefficient REAL,
+            PRIMARY KEY (utility, home_id, date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS sync_state (
+            utility TEXT PRIMARY KEY,
+            watermark TEXT NOT NULL,
+            synced_at TEXT NOT NULL
+        );
+    """
+
+    def put_documents(self, utility, docs):
+        spec = UTILITIES[utility]
+        super().put_documents(utility, docs)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO day_totals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((utility, doc['home_id'], doc['date'], _total(doc.get(spec['usage'])),
+                  _total(doc.get(spec['consumption'])), doc.get('active_score'),
+                  doc.get('correlation_coefficient')) for doc in docs)
+            )
+
+    def watermark(self, utility):
+        row = self._connect().execute("SELECT watermark FROM sync_state WHERE utility = ?", (utility,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, utility, watermark):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (utility, watermark, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    # Last date every utility has been synced through, or None before the first full sync
+    def synced_through(self):
+        rows = self._connect().execute("SELECT watermark FROM sync_state").fetchall()
+        if len(rows) < len(UTILITIES):
+            return None
+        return min(row[0] for row in rows)
+
+    # Same shape as rollups.get_rollups: the latest `limit` periods, oldest first
+    def get_rollups(self, home_id, utility, granularity, limit=12):
+        rows = self._connect().execute(
+            f"SELECT {PERIOD_SQL[granularity]} AS period, COUNT(*), SUM(usage_total), SUM(consumption_total), "
+            "AVG(active_score), AVG(correlation_coefficient) FROM day_totals "
+            "WHERE utility = ? AND home_id = ? GROUP BY period ORDER BY period DESC LIMIT ?",
+            (utility, home_id, limit)
+        ).fetchall()
+        keys = ['period', 'days', 'usage_total', 'consumption_total', 'active_score_avg', 'correlation_coefficient_avg']
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+
+# The replica at REPLICA_PATH, or None when no replica is configured
+def get_replica():
+    global _replica
+    if _replica is None:
+        get_settings()
+        path = os.getenv("REPLICA_PATH")
+        if not path:
+            return None
+        with _lock:
+            if _replica is None:
+                _replica = ReplicaStorage(path)
+    return _replica
+
+
+# Storage for an analytical read of dates from `first_date` (default: the same
+# day) up to `last_date`, both YYYY-MM-DD: the replica when a later day has
+# already been synced and no day is older than the retention cutoff, the
+# primary storage otherwise (the newest synced day may still have been
+# receiving readings, and cold days are not in the replica)
+def get_analytics_storage(last_date, first_date=None):
+    replica = get_replica()
+    if replica is not None and (first_date or last_date) >= retention_cutoff():
+        synced = replica.synced_through()
+        if synced is not None and last_date < synced:
+            return replica
+    return get_storage()
+
+
+# Rollups for trend charts from the replica, or from the MongoDB rollup
+# collection when there is no replica; None when neither is available
+def get_analytics_rollups(home_id, utility, granularity, limit=12):
+    replica = get_replica()
+    if replica is not None:
+        return replica.get_rollups(home_id, utility, granularity, limit)
+    if get_storage().name == 'mongo':
+        from rollups import get_rollups
+        return get_rollups(home_id, utility, granularity, limit)
+    return None
+
+
+# Copy documents dated from `since` (default: watermark minus the overlap) into
+# the replica and move each utility's watermark to the newest date copied
+def sync_replica(replica, since=None, batch=1000):
+    overlap = int(os.getenv("REPLICA_OVERLAP_DAYS", "3"))
+    counts = {}
+    for utility, spec in UTILITIES.items():
+        fmt = spec['date_format']
+        watermark = replica.watermark(utility)
+        start = since
+        if start is None and watermark is not None:
+            start = (datetime.strptime(watermark, '%Y-%m-%d') - timedelta(days=overlap)).strftime('%Y-%m-%d')
+        query = {} if start is None else {'date': {'$gte': datetime.strptime(start, '%Y-%m-%d').strftime(fmt)}}
+
+        newest = watermark
+        docs = []
+        counts[utility] = 0
+        for doc in get_collection(utility).find(query, {'_id': 0}).batch_size(batch):
+            doc['date'] = datetime.strptime(doc['date'], fmt).strftime('%Y-%m-%d')
+            newest = max(newest or doc['date'], doc['date'])
+            docs.append(doc)
+            if len(docs) >= batch:
+                replica.put_documents(utility, docs)
+                counts[utility] += len(docs)
+                docs = []
+        replica.put_documents(utility, docs)
+        counts[utility] += len(docs)
+        if newest is not None:
+            replica.set_watermark(utility, newest)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local analytical replica")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync = subparsers.add_parser('sync', help="copy new and changed days from MongoDB")
+    sync.add_argument('--since', help="re-copy every day from this date (YYYY-MM-DD)")
+    sync.add_argument('--path', default=None, help="replica file, defaults to REPLICA_PATH")
+    args = parser.parse_args()
+
+    get_settings()
+    path = args.path or os.getenv("REPLICA_PATH", "replica.sqlite")
+    replica = ReplicaStorage(path)
+    for utility, count in sync_replica(replica, args.since).items():
+        print(f"{utility}: {count} documents synced to {path}, watermark {replica.watermark(utility)}")
+
+
+if __name__ == '__main__':
+    main()
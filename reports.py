@@ -0,0 +1,177 @@
+# 2026-10-18
+#
+# Static daily report per home: the dashboard's water and electricity usage,
+# norm and consumption charts for one date, rendered offline to PNG or PDF.
+#
+#   python reports.py                                  # yesterday, every home, PNG
+#   python reports.py --date 2024-07-02 --format pdf --workers 8
+#   python reports.py --date 2024-07-02 --homes Home_2127,Home_2128 --force
+#
+# Files are written to <out>/<date>/<home_id>.<format>. The day's documents
+# are read with one query per utility; homes whose documents are unchanged
+# since the last run (see <out>/<date>/manifest.json) are skipped. Figures
+# are rendered with kaleido (optional dependency) on a process pool.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import sys
+import time
+
+# Bump when the report layout changes so every home is rendered again
+REPORT_VERSION = 1
+# (output index in render_usage_dashboard, row label) of the charts in a report
+PANELS = [(7, 'Usage'), (9, 'Usage Norm'), (11, 'Consumption')]
+WIDTH, HEIGHT = 1200, 1800
+
+
+# Fingerprint of everything a home's report is drawn from
+def input_digest(water_doc, electricity_doc, fmt):
+    payload = json.dumps([REPORT_VERSION, fmt, water_doc, electricity_doc], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# One-line status of a utility, as shown by the dashboard's indicators
+def status_line(label, day):
+    from dash_app import determine_activity_level, determine_regularity_level, determine_status
+
+    activity, _ = determine_activity_level(day.active_score, day.low_norm, day.norm_score, day.high_norm)
+    regularity, _ = determine_regularity_level(day.corr_coef)
+    status, _ = determine_status(activity, regularity)
+    return f'{label}: {status} ({activity} activity, {regularity} regularity)'
+
+
+# The dashboard's figures for both utilities stacked into one six-row figure
+def build_report_figure(date, home_id):
+    from plotly.subplots import make_subplots
+    from dash_app import get_data_for_date_and_home, render_usage_dashboard
+
+    panels = []
+    for usage in ('water', 'electricity'):
+        outputs = render_usage_dashboard(usage, date, home_id)
+        panels += [(usage, label, outputs[index].figure) for index, label in PANELS]
+
+    figure = make_subplots(
+        rows=len(panels), cols=1, vertical_spacing=0.04,
+        subplot_titles=[f'{usage.capitalize()} {label}: {panel.layout.title.text}' for usage, label, panel in panels]
+    )
+    for row, (usage, label, panel) in enumerate(panels, 1):
+        for trace in panel.data:
+            figure.add_trace(trace, row=row, col=1)
+        figure.update_yaxes(title_text=panel.layout.yaxis.title.text, range=panel.layout.yaxis.range, row=row, col=1)
+
+    data = get_data_for_date_and_home(date, home_id)
+    title = f'{home_id} {date}<br><sup>{status_line("Water", data.water)} | {status_line("Electricity", data.electricity)}</sup>'
+    figure.update_layout(title=title, showlegend=False, width=WIDTH, height=HEIGHT, margin={'t': 120})
+    return figure
+
+
+# Process-pool task: render one home's report from its already loaded documents
+def render_report(date, home_id, water_doc, electricity_doc, path, fmt):
+    from cache import get_cache
+    from dash_app import build_day_data
+
+    # Seed this process's data cache so rendering needs no database round trip
+    get_cache('data').set((home_id, date), build_day_data(water_doc, electricity_doc))
+    tmp_path = f'{path}.tmp'
+    build_report_figure(date, home_id).write_image(tmp_path, format=fmt, width=WIDTH, height=HEIGHT)
+    os.replace(tmp_path, path)
+    return home_id
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    with open(f'{path}.tmp', 'w') as handle:
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+
+# Render reports for `date` into out_dir/date, skipping unchanged homes.
+# Returns counts of rendered, skipped and failed homes.
+def generate_reports(date, out_dir='reports', fmt='png', workers=None, homes=None, force=False):
+    from storage import get_storage
+
+    storage = get_storage()
+    water_docs = storage.get_date('water', date)
+    electricity_docs = storage.get_date('electricity', date)
+    all_homes = sorted(set(water_docs) | set(electricity_docs))
+    if homes:
+        all_homes = [home_id for home_id in all_homes if home_id in homes]
+
+    day_dir = os.path.join(out_dir, date)
+    os.makedirs(day_dir, exist_ok=True)
+    manifest_path = os.path.join(day_dir, 'manifest.json')
+    manifest = _load_manifest(manifest_path)
+
+    tasks = {}
+    for home_id in all_homes:
+        path = os.path.join(day_dir, f'{home_id}.{fmt}')
+        digest = input_digest(water_docs.get(home_id), electricity_docs.get(home_id), fmt)
+        if not force and manifest.get(home_id) == digest and os.path.exists(path):
+            continue
+        tasks[home_id] = (digest, path)
+
+    counts = {'rendered': 0, 'skipped': len(all_homes) - len(tasks), 'failed': 0}
+    if not tasks:
+        return counts
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                render_report, date, home_id, water_docs.get(home_id), electricity_docs.get(home_id), path, fmt
+            ): home_id
+            for home_id, (digest, path) in tasks.items()
+        }
+        for future in as_completed(futures):
+            home_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                counts['failed'] += 1
+                print(f"Error rendering report for {home_id}: {e}")
+                continue
+            manifest[home_id] = tasks[home_id][0]
+            counts['rendered'] += 1
+    _save_manifest(manifest_path, manifest)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render static daily report images per home")
+    parser.add_argument('--date', help="report date (YYYY-MM-DD), defaults to yesterday")
+    parser.add_argument('--out', default=os.getenv("REPORTS_DIR", "reports"), help="output directory (default reports)")
+    parser.add_argument('--format', choices=['png', 'pdf', 'svg'], default='png')
+    parser.add_argument('--workers', type=int, default=None, help="render processes (default: one per CPU)")
+    parser.add_argument('--homes', help="comma-separated home ids, defaults to every home with data")
+    parser.add_argument('--force', action='store_true', help="render every home even if its data is unchanged")
+    args = parser.parse_args()
+
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        print("Report rendering requires kaleido (pip install kaleido)")
+        return 1
+
+    date = args.date or (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+    homes = set(args.homes.split(',')) if args.homes else None
+    started = time.monotonic()
+    counts = generate_reports(date, args.out, args.format, args.workers, homes, args.force)
+    print(
+        f"{date}: {counts['rendered']} rendered, {counts['skipped']} unchanged, {counts['failed']} failed "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
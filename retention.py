@@ -0,0 +1,77 @@
+# 2026-10-18
+#
+# Moves daily documents older than RETENTION_DAYS (default 365) from the hot
+# water/electricity collections into the cold collection at hourly resolution.
+#
+#   python retention.py                  # move every utility
+#   python retention.py --utility water --dry-run
+#
+# Each batch is upserted into the cold collection before the hot documents
+# are deleted, so an interrupted run leaves a day in both tiers (which
+# storage.TieredStorage reads as the hot copy) rather than in neither.
+# Run rollups.py first so periods are rolled up from full-resolution data.
+
+import argparse
+from datetime import datetime
+
+from db import UTILITIES, get_collection
+from storage import downsample_document, retention_cutoff
+
+
+def ensure_indexes():
+    cold = get_collection('cold')
+    cold.create_index([('utility', 1), ('home_id', 1), ('date', 1)])
+    cold.create_index([('utility', 1), ('date', 1)])
+
+
+# Move one utility's documents dated before `cutoff` (ISO) in batches;
+# returns the number of days moved (or that would be moved with dry_run)
+def move_to_cold(utility, cutoff=None, batch_size=500, dry_run=False):
+    from pymongo import ReplaceOne
+
+    fmt = UTILITIES[utility]['date_format']
+    cutoff = cutoff or retention_cutoff()
+    hot = get_collection(utility)
+    cold = get_collection('cold')
+    # Both date formats are zero-padded year-first, so string order is date order
+    query = {'date': {'$lt': datetime.strptime(cutoff, '%Y-%m-%d').strftime(fmt)}}
+    if dry_run:
+        return hot.count_documents(query)
+
+    moved = 0
+    ids, replacements = [], []
+
+    def flush():
+        if replacements:
+            cold.bulk_write(replacements, ordered=False)
+            hot.delete_many({'_id': {'$in': ids}})
+        return len(ids)
+
+    for doc in hot.find(query).batch_size(batch_size):
+        ids.append(doc['_id'])
+        doc['date'] = datetime.strptime(doc['date'], fmt).strftime('%Y-%m-%d')
+        cold_doc = downsample_document(doc, utility)
+        replacements.append(ReplaceOne({'_id': cold_doc['_id']}, cold_doc, upsert=True))
+        if len(ids) >= batch_size:
+            moved += flush()
+            ids, replacements = [], []
+    return moved + flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old daily documents to the hourly cold tier")
+    parser.add_argument('--utility', choices=list(UTILITIES), help="only move one utility")
+    parser.add_argument('--batch-size', type=int, default=500, help="documents per bulk write (default 500)")
+    parser.add_argument('--dry-run', action='store_true', help="only count the documents that would move")
+    args = parser.parse_args()
+
+    cutoff = retention_cutoff()
+    ensure_indexes()
+    for utility in [args.utility] if args.utility else UTILITIES:
+        count = move_to_cold(utility, cutoff, args.batch_size, args.dry_run)
+        verb = "would move" if args.dry_run else "moved"
+        print(f"{utility}: {verb} {count} days before {cutoff} to the cold tier")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# 2026-10-18
+#
+# Materialized day/week/month rollups per home and utility.
+#
+#   python rollups.py                     # roll up days that arrived since the last run
+#   python rollups.py --since 2024-01-01  # rebuild every period from that date on
+#
+# Each run recomputes only the periods touched by new daily documents with one
+# aggregation pipeline per utility and granularity, and upserts them with $merge.
+# Trend views then read a handful of rollup documents instead of every day.
+#
+# The watermark is the newest document date seen, but homes keep delivering
+# days after it was taken, so each run starts ROLLUP_OVERLAP_DAYS (default 3)
+# before it, as replica.py does; recomputing a period replaces it.
+
+import argparse
+from datetime import datetime, timedelta
+import os
+
+from db import UTILITIES, get_collection
+
+GRANULARITIES = ['day', 'week', 'month']
+
+
+# First day of the period (Monday-based weeks) containing `day`
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def rollup_pipeline(utility, granularity, since):
+    spec = UTILITIES[utility]
+    fmt = spec['date_format']
+    period = {'$dateTrunc': {'date': '$day', 'unit': granularity}}
+    if granularity == 'week':
+        period['$dateTrunc']['startOfWeek'] = 'monday'
+    return [
+        {'$match': {'date': {'$gte': since.strftime(fmt)}}},
+        {'$project': {
+            'home_id': 1,
+            'day': {'$dateFromString': {'dateString': '$date', 'format': fmt}},
+            'usage': {'$sum': f"${spec['usage']}"},
+            'consumption': {'$sum': f"${spec['consumption']}"},
+            'active_score': 1,
+            'correlation_coefficient': 1,
+        }},
+        {'$group': {
+            '_id': {'home_id': '$home_id', 'period': period},
+            'days': {'$sum': 1},
+            'usage_total': {'$sum': '$usage'},
+            'consumption_total': {'$sum': '$consumption'},
+            'active_score_avg': {'$avg': '$active_score'},
+            'correlation_coefficient_avg': {'$avg': '$correlation_coefficient'},
+        }},
+        {'$project': {
+            '_id': {'$concat': [
+                '$_id.home_id', f'|{utility}|{granularity}|',
+                {'$dateToString': {'date': '$_id.period', 'format': '%Y-%m-%d'}},
+            ]},
+            'home_id': '$_id.home_id',
+            'utility': {'$literal': utility},
+            'granularity': {'$literal': granularity},
+            'period': {'$dateToString': {'date': '$_id.period', 'format': '%Y-%m-%d'}},
+            'days': 1,
+            'usage_total': 1,
+            'consumption_total': 1,
+            'active_score_avg': 1,
+            'correlation_coefficient_avg': 1,
+            'updated_at': '$$NOW',
+        }},
+        {'$merge': {
+            'into': get_collection('rollups').name,
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+# Latest daily document date in a utility's collection, as a datetime
+def latest_date(utility):
+    doc = get_collection(utility).find_one({}, {'date': 1}, sort=[('date', -1)])
+    if doc is None:
+        return None
+    return datetime.strptime(doc['date'], UTILITIES[utility]['date_format'])
+
+
+# Refresh rollups for one utility from `since` (defaults to the stored watermark
+# minus the overlap) and move the watermark to the newest daily document.
+def update_rollups(utility, since=None):
+    jobs = get_collection('jobs')
+    state_id = f'rollups:{utility}'
+    newest = latest_date(utility)
+    if newest is None:
+        return None
+    if since is None:
+        state = jobs.find_one({'_id': state_id})
+        if state is None:
+            since = datetime.strptime('1970-01-01', '%Y-%m-%d')
+        else:
+            overlap = int(os.getenv("ROLLUP_OVERLAP_DAYS", "3"))
+            since = datetime.strptime(state['watermark'], '%Y-%m-%d') - timedelta(days=overlap)
+
+    collection = get_collection(utility)
+    for granularity in GRANULARITIES:
+        collection.aggregate(rollup_pipeline(utility, granularity, period_start(since, granularity)))
+
+    jobs.update_one(
+        {'_id': state_id},
+        {'$set': {'watermark': newest.strftime('%Y-%m-%d'), 'updated_at': datetime.now()}},
+        upsert=True
+    )
+    return newest
+
+
+def ensure_indexes():
+    get_collection('rollups').create_index([('home_id', 1), ('utility', 1), ('granularity', 1), ('period', -1)])
+
+
+# Most recent `limit` rollups for a home, oldest first, for trend charts
+def get_rollups(home_id, utility, granularity, limit=12):
+    cursor = get_collection('rollups').find(
+        {'home_id': home_id, 'utility': utility, 'granularity': granularity},
+        {'_id': 0, 'period': 1, 'days': 1, 'usage_total': 1, 'consumption_total': 1,
+         'active_score_avg': 1, 'correlation_coefficient_avg': 1}
+    ).sort('period', -1).limit(limit)
+    return list(cursor)[::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the day/week/month rollup collection")
+    parser.add_argument('--since', help="rebuild periods from this date (YYYY-MM-DD)")
+    parser.add_argument('--utility', choices=list(UTILITIES), help="only roll up one utility")
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+    ensure_indexes()
+    for utility in [args.utility] if args.utility else UTILITIES:
+        newest = update_rollups(utility, since)
+        print(f"{utility}: rolled up to {newest:%Y-%m-%d}" if newest else f"{utility}: no data")
+
+
+if __name__ == '__main__':
+    main()
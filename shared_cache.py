@@ -0,0 +1,267 @@
+# 2026-10-18
+#
+# Node-wide cache store shared by every dashboard worker on a machine, so days,
+# figures and fleet bands are fetched, rendered and held once per node rather
+# than once per worker.
+#
+#   SHARED_CACHE=1      keep the data, figure and fleet caches here (see cache.py)
+#   SHARED_CACHE_PATH   store file, default cache.sqlite in a private directory
+#                       under $XDG_RUNTIME_DIR, else /dev/shm/smart-meter-cache-<uid>
+#                       (shared memory; the temp directory where /dev/shm is missing)
+#   SHARED_CACHE_MB     size limit; past it the least recently used entries are
+#                       evicted (default 256)
+#
+#   python shared_cache.py stats
+#   python shared_cache.py invalidate --date 2024-07-02 [--home Home_2127]   # after rescoring
+#   python shared_cache.py clear
+#
+# The store is an SQLite database in WAL mode, so workers read concurrently and
+# no server process is needed. Entries are tagged with the (home, date) they
+# were built from; invalidating a day drops them for every worker at once.
+#
+# Values are plain JSON, never pickles. The store's directory must belong to
+# this user and not be writable by others, and so must the file; a store that
+# fails these checks is refused and the workers keep per-process caches.
+
+import argparse
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from db import get_settings
+import metrics
+
+# Last-access times are only rewritten when older than this, so hits rarely write
+TOUCH_INTERVAL = 30
+# Evicting down to this fraction of the limit keeps every insert from evicting
+EVICT_TO = 0.9
+
+_lock = threading.Lock()
+_store = None
+_refused = False
+
+
+# Raise PermissionError unless `path` is owned by this user and not writable by
+# anyone else (the -wal/-shm files SQLite adds follow the directory's access)
+def check_private(path, is_dir):
+    info = os.lstat(path)
+    kind = stat.S_ISDIR(info.st_mode) if is_dir else stat.S_ISREG(info.st_mode)
+    if not kind or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} is not a private {'directory' if is_dir else 'file'} of uid {os.getuid()}")
+
+
+class SharedStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            cache TEXT NOT NULL,
+            key TEXT NOT NULL,
+            home_id TEXT,
+            date TEXT,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires REAL,
+            accessed REAL NOT NULL,
+            PRIMARY KEY (cache, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS entries_by_day ON entries (date, home_id);
+        CREATE INDEX IF NOT EXISTS entries_by_access ON entries (accessed);
+        CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+        INSERT OR IGNORE INTO totals VALUES (0, 0);
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+            BEGIN UPDATE totals SET bytes = bytes + new.size; END;
+        CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+            BEGIN UPDATE totals SET bytes = bytes + new.size - old.size; END;
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+            BEGIN UPDATE totals SET bytes = bytes - old.size; END;
+        CREATE TABLE IF NOT EXISTS claims (name TEXT PRIMARY KEY, expires REAL NOT NULL);
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Cached days are not for other users of the machine
+        check_private(os.path.dirname(os.path.abspath(path)), True)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR | os.O_NOFOLLOW, 0o600))
+        check_private(path, False)
+        conn = self._connect()
+        with conn:
+            conn.executescript(self.SCHEMA)
+
+    # One connection per thread, opened again in a forked worker
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, cache, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires, accessed FROM entries WHERE cache = ? AND key = ?", (cache, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires < now:
+            with conn:
+                conn.execute("DELETE FROM entries WHERE cache = ? AND key = ? AND expires < ?", (cache, key, now))
+            return None
+        if now - accessed > TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE entries SET accessed = ? WHERE cache = ? AND key = ?", (now, cache, key))
+        return value
+
+    def contains(self, cache, key):
+        row = self._connect().execute(
+            "SELECT expires FROM entries WHERE cache = ? AND key = ?", (cache, key)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time.time())
+
+    def set(self, cache, key, value, home_id=None, date=None, ttl=None):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (cache, key) DO UPDATE SET "
+                "home_id = excluded.home_id, date = excluded.date, value = excluded.value, size = excluded.size, "
+                "expires = excluded.expires, accessed = excluded.accessed",
+                (cache, key, home_id, date, value, len(value), now + ttl if ttl else None, now)
+            )
+            total = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+        if total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def delete(self, cache, key):
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM entries WHERE cache = ? AND key = ?", (cache, key)).rowcount
+
+    # Drop expired entries, then the least recently used ones until `target` bytes remain
+    def evict(self, target):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+            while True:
+                total, count = conn.execute("SELECT bytes, (SELECT COUNT(*) FROM entries) FROM totals").fetchone()
+                if total <= target or not count:
+                    break
+                evicted = conn.execute(
+                    "DELETE FROM entries WHERE (cache, key) IN "
+                    "(SELECT cache, key FROM entries ORDER BY accessed LIMIT 16)"
+                ).rowcount
+                metrics.inc('shared_cache_evictions_total', evicted)
+
+    # Drop every entry built from the given (home_id, date) days; a home_id of
+    # None drops the whole date. Entries for all homes of a date (fleet bands)
+    # go with any of its days.
+    def invalidate(self, days):
+        conn = self._connect()
+        with conn:
+            removed = 0
+            for home_id, date in days:
+                if home_id is None:
+                    removed += conn.execute("DELETE FROM entries WHERE date = ?", (date,)).rowcount
+                else:
+                    removed += conn.execute(
+                        "DELETE FROM entries WHERE date = ? AND (home_id = ? OR home_id IS NULL)", (date, home_id)
+                    ).rowcount
+        return removed
+
+    def clear(self, cache=None):
+        conn = self._connect()
+        with conn:
+            if cache is None:
+                return conn.execute("DELETE FROM entries").rowcount
+            return conn.execute("DELETE FROM entries WHERE cache = ?", (cache,)).rowcount
+
+    # Take `name` for `ttl` seconds unless another worker holds it; used so only
+    # one worker per node does work whose result all of them share
+    def claim(self, name, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM claims WHERE expires < ?", (now,))
+            return conn.execute("INSERT OR IGNORE INTO claims VALUES (?, ?)", (name, now + ttl)).rowcount == 1
+
+    # {cache: {'size': entries, 'bytes': bytes}}
+    def stats(self):
+        rows = self._connect().execute("SELECT cache, COUNT(*), SUM(size) FROM entries GROUP BY cache")
+        return {cache: {'size': count, 'bytes': size} for cache, count, size in rows}
+
+
+def enabled():
+    get_settings()
+    return os.getenv("SHARED_CACHE", "") == "1"
+
+
+# cache.sqlite in a directory only this user can enter, created on first use
+def default_path():
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime:
+        directory = os.path.join(runtime, 'smart-meter-cache')
+    else:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        directory = os.path.join(base, f'smart-meter-cache-{os.getuid()}')
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    return os.path.join(directory, 'cache.sqlite')
+
+
+def _open_store():
+    return SharedStore(
+        os.getenv("SHARED_CACHE_PATH") or default_path(),
+        int(float(os.getenv("SHARED_CACHE_MB", "256")) * 1024 * 1024)
+    )
+
+
+# The node's shared store, or None unless SHARED_CACHE=1 and the store is usable
+def get_store():
+    global _store, _refused
+    if _store is None:
+        if _refused or not enabled():
+            return None
+        with _lock:
+            if _store is None and not _refused:
+                try:
+                    _store = _open_store()
+                except OSError as e:
+                    _refused = True
+                    print(f"Error opening shared cache, using per-worker caches: {e}")
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the node-wide dashboard cache")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="entries and bytes per cache")
+    invalidate = subparsers.add_parser('invalidate', help="drop a rescored day for every worker")
+    invalidate.add_argument('--date', required=True, help="day whose documents changed (YYYY-MM-DD)")
+    invalidate.add_argument('--home', help="only this home, defaults to every home")
+    clear = subparsers.add_parser('clear', help="drop every entry")
+    clear.add_argument('--cache', help="only this cache (data, figure, fleet)")
+    args = parser.parse_args()
+
+    get_settings()
+    store = _open_store()
+    if args.command == 'stats':
+        for cache, stats in sorted(store.stats().items()):
+            print(f"{cache}: {stats['size']} entries, {stats['bytes']} bytes")
+        print(f"limit: {store.max_bytes} bytes at {store.path}")
+    elif args.command == 'invalidate':
+        print(f"{store.invalidate([(args.home, args.date)])} entries dropped")
+    else:
+        print(f"{store.clear(args.cache)} entries dropped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# 2026-10-18
+
+import threading
+
+import metrics
+
+metrics.describe('singleflight_calls_total', "Calls that ran the underlying function")
+metrics.describe('singleflight_coalesced_total', "Calls that waited for an identical in-flight call")
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Coalesces concurrent calls with the same key: the first caller runs the
+# function, later callers wait for it and receive the same result. If the
+# function raises, every waiter re-raises the same exception. Nothing is kept
+# once the call finishes; caching is left to the caller.
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.inc('singleflight_coalesced_total', group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.inc('singleflight_calls_total', group=self.name)
+        try:
+            call.result = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
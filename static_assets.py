@@ -0,0 +1,188 @@
+# 2026-10-18
+#
+# Stylesheets served by the app itself instead of a CDN, so pages render on
+# sites without internet access and repeat visits come from the browser cache.
+#
+#   python static_assets.py build             # check static/bootstrap.min.css, write .gz/.br variants
+#   python static_assets.py build --refetch   # download the pinned Bootstrap CSS first, then commit it
+#
+# Files listed in STYLESHEETS are read from static/ once per worker and served
+# as /_static/<name>.<content hash>.<ext> with a one-year immutable
+# Cache-Control: a changed file gets a new URL instead of a stale cached copy.
+# The .gz/.br variants written by `build` go to clients that accept them; a
+# missing or outdated gzip variant is compressed at startup instead.
+
+import argparse
+import base64
+import gzip
+import hashlib
+import os
+import threading
+
+from compression import brotli_module
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+URL_PREFIX = '/_static/'
+MAX_AGE = 365 * 24 * 3600
+
+# The theme dash-bootstrap-components 1.6.0 links as dbc.themes.BOOTSTRAP, with
+# the Subresource Integrity hash Bootstrap publishes for it
+BOOTSTRAP_URL = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css'
+BOOTSTRAP_INTEGRITY = 'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH'
+
+# Page stylesheets in link order; custom.css overrides Bootstrap
+STYLESHEETS = ['bootstrap.min.css', 'custom.css']
+
+_lock = threading.Lock()
+_assets = None
+
+
+def _read(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+# Precompressed variant of `path` if it exists and is not older than the file
+def _variant(path, suffix):
+    variant = path + suffix
+    if os.path.exists(variant) and os.path.getmtime(variant) >= os.path.getmtime(path):
+        return _read(variant)
+    return None
+
+
+# Load one stylesheet: (fingerprinted name, {encoding: body}, content hash)
+def load_asset(filename):
+    path = os.path.join(STATIC_DIR, filename)
+    body = _read(path)
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    stem, ext = os.path.splitext(filename)
+    bodies = {'identity': body, 'gzip': _variant(path, '.gz') or gzip.compress(body, compresslevel=9, mtime=0)}
+    br = _variant(path, '.br')
+    if br is not None:
+        bodies['br'] = br
+    return f'{stem}.{digest}{ext}', bodies, digest
+
+
+# {fingerprinted name: ({encoding: body}, content hash)} and the link URLs, loaded once
+def get_assets():
+    global _assets
+    if _assets is None:
+        with _lock:
+            if _assets is None:
+                assets, urls = {}, []
+                for filename in STYLESHEETS:
+                    try:
+                        name, bodies, digest = load_asset(filename)
+                    except OSError:
+                        if filename != 'bootstrap.min.css':
+                            raise
+                        # Without the vendored copy pages still render, but need the CDN
+                        print(f"Error loading static/{filename}, run `python static_assets.py build --refetch`; using {BOOTSTRAP_URL}")
+                        urls.append(BOOTSTRAP_URL)
+                        continue
+                    assets[name] = (bodies, digest)
+                    urls.append(URL_PREFIX + name)
+                _assets = assets, urls
+    return _assets
+
+
+# Stylesheet URLs for dash.Dash(external_stylesheets=...)
+def stylesheets():
+    return get_assets()[1]
+
+
+# GET /_static/<name>: the best encoding the client accepts, cacheable for a year
+def serve_asset(name):
+    from flask import Response, abort, request
+
+    entry = get_assets()[0].get(name)
+    if entry is None:
+        abort(404)
+    bodies, digest = entry
+    encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in bodies]) or 'identity'
+    etag = digest if encoding == 'identity' else f'{digest}-{encoding}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(bodies[encoding], mimetype='text/css')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(server):
+    get_assets()
+    server.add_url_rule(URL_PREFIX + '<name>', 'static_asset', serve_asset)
+
+    # Dash versions its default favicon URL (?v=<dash version>) but sends no caching headers
+    def cache_favicon(response):
+        from flask import request
+
+        if response.status_code == 200 and request.path.endswith('/_favicon.ico') and request.args.get('v'):
+            response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+        return response
+
+    server.after_request(cache_favicon)
+
+
+# Raise ValueError unless `body` matches Bootstrap's published integrity hash
+def check_bootstrap(body, source):
+    algorithm, expected = BOOTSTRAP_INTEGRITY.split('-', 1)
+    actual = base64.b64encode(hashlib.new(algorithm, body).digest()).decode()
+    if actual != expected:
+        raise ValueError(f"{source} does not match {BOOTSTRAP_INTEGRITY}")
+
+
+# Download the pinned Bootstrap build and check it before replacing the vendored copy
+def fetch_bootstrap(path):
+    from urllib.request import urlopen
+
+    with urlopen(BOOTSTRAP_URL, timeout=30) as response:
+        body = response.read()
+    check_bootstrap(body, BOOTSTRAP_URL)
+    with open(f'{path}.tmp', 'wb') as handle:
+        handle.write(body)
+    os.replace(f'{path}.tmp', path)
+
+
+# Write the precompressed variants of the committed stylesheets; only `refetch`
+# touches the network, so offline runners can build
+def build(refetch=False):
+    brotli = brotli_module()
+    for filename in STYLESHEETS:
+        path = os.path.join(STATIC_DIR, filename)
+        if filename == 'bootstrap.min.css':
+            if refetch:
+                fetch_bootstrap(path)
+                print(f"Downloaded {BOOTSTRAP_URL} to {path}")
+            elif not os.path.exists(path):
+                print(f"Error: static/{filename} is missing, pages will use {BOOTSTRAP_URL}; run `build --refetch`")
+                continue
+        body = _read(path)
+        if filename == 'bootstrap.min.css' and not refetch:
+            check_bootstrap(body, path)
+        variants = {'.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli:
+            variants['.br'] = brotli.compress(body, quality=11)
+        for suffix, data in variants.items():
+            with open(path + suffix, 'wb') as handle:
+                handle.write(data)
+        sizes = ', '.join(f"{suffix[1:]} {len(data)}" for suffix, data in variants.items())
+        print(f"{filename}: {len(body)} bytes ({sizes})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare the locally served stylesheets")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="write precompressed variants of the stylesheets")
+    build_parser.add_argument('--refetch', action='store_true', help="download the pinned Bootstrap CSS first")
+    args = parser.parse_args()
+    build(args.refetch)
+
+
+if __name__ == '__main__':
+    main()
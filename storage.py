@@ -0,0 +1,399 @@
+# 2026-10-18
+#
+# Storage backends for daily meter documents.
+#
+# Every backend answers the same questions with dates as 'YYYY-MM-DD' strings
+# and returns documents with their 'date' in that format, whatever the source
+# collection uses:
+#
+#   get_day(utility, home_id, date)            -> document or None
+#   get_days(utility, pairs)                   -> {(date, home_id): document}
+#   get_range(utility, home_id, start, end)    -> documents in date order
+#   get_date(utility, date)                    -> {home_id: document} for every home
+#   list_homes(utility=None)                   -> sorted home ids
+#
+# STORAGE_BACKEND=mongo (default) reads the MongoDB collections. STORAGE_BACKEND=sqlite
+# reads a local SQLite file (SQLITE_PATH) that can be filled from MongoDB with
+#
+#   python storage.py sync --start 2023-01-01 --end 2023-12-31 [--path meters.sqlite]
+#
+# With MongoDB, days older than RETENTION_DAYS (default 365) may have been moved
+# by retention.py into the cold collection at hourly resolution. TieredStorage
+# routes reads for those dates to both tiers and returns cold days expanded
+# back to 96 slots, marked with 'resolution': 'hourly'.
+
+from abc import ABC, abstractmethod
+import argparse
+from datetime import datetime, timedelta
+import heapq
+import json
+import os
+import threading
+
+from db import INTERVALS_PER_DAY, UTILITIES, get_collection, get_settings
+
+SLOTS_PER_HOUR = 4
+
+# Series summed rather than averaged when four 15-minute slots become an hour:
+# water consumption is a volume per slot; usage, norms and power are rates or scores
+COLD_SUMMED_FIELDS = {'water_consumption'}
+
+_lock = threading.Lock()
+_storage = None
+
+
+def _to_iso(date, fmt):
+    return datetime.strptime(date, fmt).strftime('%Y-%m-%d')
+
+
+def _from_iso(date, fmt):
+    return datetime.strptime(date, '%Y-%m-%d').strftime(fmt)
+
+
+def _normalize(doc, fmt):
+    doc['date'] = _to_iso(doc['date'], fmt)
+    return doc
+
+
+# Interface every backend implements; get_days falls back to one get_day per pair
+class Storage(ABC):
+    name = None
+
+    @abstractmethod
+    def get_day(self, utility, home_id, date):
+        pass
+
+    def get_days(self, utility, pairs):
+        docs = {}
+        for date, home_id in pairs:
+            doc = self.get_day(utility, home_id, date)
+            if doc is not None:
+                docs[(date, home_id)] = doc
+        return docs
+
+    @abstractmethod
+    def get_range(self, utility, home_id, start, end, fields=None):
+        pass
+
+    @abstractmethod
+    def get_date(self, utility, date):
+        pass
+
+    @abstractmethod
+    def list_homes(self, utility=None):
+        pass
+
+
+class MongoStorage(Storage):
+    name = 'mongo'
+
+    def _projection(self, fields):
+        if fields is None:
+            return {'_id': 0}
+        return dict({'_id': 0, 'date': 1, 'home_id': 1}, **{field: 1 for field in fields})
+
+    def get_day(self, utility, home_id, date):
+        fmt = UTILITIES[utility]['date_format']
+        doc = get_collection(utility).find_one({'date': _from_iso(date, fmt), 'home_id': home_id}, {'_id': 0})
+        return _normalize(doc, fmt) if doc else None
+
+    def get_days(self, utility, pairs):
+        if not pairs:
+            return {}
+        fmt = UTILITIES[utility]['date_format']
+        query = {'$or': [{'date': _from_iso(date, fmt), 'home_id': home_id} for date, home_id in pairs]}
+        return {
+            (doc['date'], doc['home_id']): doc
+            for doc in (_normalize(doc, fmt) for doc in get_collection(utility).find(query, {'_id': 0}))
+        }
+
+    def get_range(self, utility, home_id, start, end, fields=None):
+        fmt = UTILITIES[utility]['date_format']
+        cursor = get_collection(utility).find(
+            {'home_id': home_id, 'date': {'$gte': _from_iso(start, fmt), '$lte': _from_iso(end, fmt)}},
+            self._projection(fields)
+        ).sort('date', 1).batch_size(int(os.getenv("STORAGE_BATCH_SIZE", "100")))
+        for doc in cursor:
+            yield _normalize(doc, fmt)
+
+    def get_date(self, utility, date):
+        fmt = UTILITIES[utility]['date_format']
+        cursor = get_collection(utility).find({'date': _from_iso(date, fmt)}, {'_id': 0})
+        return {doc['home_id']: _normalize(doc, fmt) for doc in cursor}
+
+    def list_homes(self, utility=None):
+        homes = set()
+        for name in [utility] if utility else UTILITIES:
+            homes.update(get_collection(name).distinct('home_id'))
+        return sorted(homes)
+
+
+# Days before this ISO date may live in the cold tier
+def retention_cutoff(today=None):
+    today = today or datetime.now()
+    return (today - timedelta(days=int(os.getenv("RETENTION_DAYS", "365")))).strftime('%Y-%m-%d')
+
+
+def _series_fields(utility):
+    spec = UTILITIES[utility]
+    return [spec['usage'], spec['norm'], spec['consumption']]
+
+
+# Hourly cold-tier document from a day document whose date is already ISO.
+# Each hour is the mean (or sum, see COLD_SUMMED_FIELDS) of its reported slots.
+def downsample_document(doc, utility):
+    cold = {key: value for key, value in doc.items() if key != '_id'}
+    for field in _series_fields(utility):
+        values = doc.get(field)
+        if not values:
+            continue
+        hours = []
+        for hour in range(0, len(values), SLOTS_PER_HOUR):
+            slots = [value for value in values[hour:hour + SLOTS_PER_HOUR] if value is not None]
+            if not slots:
+                hours.append(None)
+            elif field in COLD_SUMMED_FIELDS:
+                hours.append(sum(slots))
+            else:
+                hours.append(sum(slots) / len(slots))
+        cold[field] = hours
+    cold.update(
+        _id=f"{doc['home_id']}|{utility}|{doc['date']}", utility=utility, resolution='hourly'
+    )
+    return cold
+
+
+# Expand a cold-tier document back to 96 slots: averaged series repeat each
+# hour, summed series spread it evenly over its four slots
+def upsample_document(doc, utility):
+    doc.pop('_id', None)
+    doc.pop('utility', None)
+    for field in _series_fields(utility):
+        hours = doc.get(field)
+        if not hours:
+            continue
+        if field in COLD_SUMMED_FIELDS:
+            hours = [None if value is None else value / SLOTS_PER_HOUR for value in hours]
+        doc[field] = [value for value in hours for _ in range(SLOTS_PER_HOUR)][:INTERVALS_PER_DAY]
+    return doc
+
+
+# Hourly documents of every utility in the 'cold' collection, dated ISO
+class ColdStorage(Storage):
+    name = 'cold'
+
+    def _projection(self, fields):
+        if fields is None:
+            return None
+        return dict({'_id': 0, 'date': 1, 'home_id': 1, 'resolution': 1}, **{field: 1 for field in fields})
+
+    def _find(self, utility, query, fields=None):
+        cursor = get_collection('cold').find(dict(query, utility=utility), self._projection(fields))
+        return (upsample_document(doc, utility) for doc in cursor)
+
+    def get_day(self, utility, home_id, date):
+        return next(self._find(utility, {'home_id': home_id, 'date': date}), None)
+
+    def get_days(self, utility, pairs):
+        if not pairs:
+            return {}
+        query = {'$or': [{'date': date, 'home_id': home_id} for date, home_id in pairs]}
+        return {(doc['date'], doc['home_id']): doc for doc in self._find(utility, query)}
+
+    def get_range(self, utility, home_id, start, end, fields=None):
+        cursor = get_collection('cold').find(
+            {'utility': utility, 'home_id': home_id, 'date': {'$gte': start, '$lte': end}}, self._projection(fields)
+        ).sort('date', 1)
+        for doc in cursor:
+            yield upsample_document(doc, utility)
+
+    def get_date(self, utility, date):
+        return {doc['home_id']: doc for doc in self._find(utility, {'date': date})}
+
+    def list_homes(self, utility=None):
+        query = {'utility': utility} if utility else {}
+        return sorted(get_collection('cold').distinct('home_id', query))
+
+
+# Query router over the hot backend and the cold tier. Dates on or after
+# retention_cutoff() are only read from the hot backend; older dates are read
+# from both, since the retention job may not have moved them yet, and the hot
+# document wins when a day exists in both.
+class TieredStorage(Storage):
+    def __init__(self, hot, cold):
+        self.hot = hot
+        self.cold = cold
+        self.name = hot.name
+
+    def get_day(self, utility, home_id, date):
+        doc = self.hot.get_day(utility, home_id, date)
+        if doc is None and date < retention_cutoff():
+            doc = self.cold.get_day(utility, home_id, date)
+        return doc
+
+    def get_days(self, utility, pairs):
+        docs = self.hot.get_days(utility, pairs)
+        cutoff = retention_cutoff()
+        missing = [(date, home_id) for date, home_id in pairs if date < cutoff and (date, home_id) not in docs]
+        if missing:
+            docs.update(self.cold.get_days(utility, missing))
+        return docs
+
+    def get_range(self, utility, home_id, start, end, fields=None):
+        cutoff = retention_cutoff()
+        hot = self.hot.get_range(utility, home_id, start, end, fields)
+        if start >= cutoff:
+            yield from hot
+            return
+        last_cold = min(end, (datetime.strptime(cutoff, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d'))
+        cold = self.cold.get_range(utility, home_id, start, last_cold, fields)
+        # Both tiers are in date order; hot documents sort first on equal dates
+        tagged = heapq.merge(
+            ((doc['date'], 0, doc) for doc in hot), ((doc['date'], 1, doc) for doc in cold), key=lambda t: t[:2]
+        )
+        previous = None
+        for date, _, doc in tagged:
+            if date != previous:
+                yield doc
+            previous = date
+
+    def get_date(self, utility, date):
+        docs = self.hot.get_date(utility, date)
+        if date < retention_cutoff():
+            for home_id, doc in self.cold.get_date(utility, date).items():
+                docs.setdefault(home_id, doc)
+        return docs
+
+    def list_homes(self, utility=None):
+        return sorted(set(self.hot.list_homes(utility)) | set(self.cold.list_homes(utility)))
+
+
+# One row per (utility, home_id, date) with the document stored as JSON, on a
+# clustered primary key so a home's date range is one contiguous index scan.
+# The file is memory-mapped for reads.
+class SQLiteStorage(Storage):
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS days (
+            utility TEXT NOT NULL,
+            home_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            doc TEXT NOT NULL,
+            PRIMARY KEY (utility, home_id, date)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS days_by_date ON days (utility, date);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path)
+            conn.execute(f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(1 << 30)))}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, row, fields=None):
+        doc = json.loads(row[0])
+        if fields is not None:
+            doc = {key: doc.get(key) for key in ['date', 'home_id'] + list(fields)}
+        return doc
+
+    def get_day(self, utility, home_id, date):
+        row = self._connect().execute(
+            "SELECT doc FROM days WHERE utility = ? AND home_id = ? AND date = ?", (utility, home_id, date)
+        ).fetchone()
+        return self._load(row) if row else None
+
+    def get_range(self, utility, home_id, start, end, fields=None):
+        rows = self._connect().execute(
+            "SELECT doc FROM days WHERE utility = ? AND home_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (utility, home_id, start, end)
+        )
+        for row in rows:
+            yield self._load(row, fields)
+
+    def get_date(self, utility, date):
+        rows = self._connect().execute("SELECT doc FROM days WHERE utility = ? AND date = ?", (utility, date))
+        return {doc['home_id']: doc for doc in (self._load(row) for row in rows)}
+
+    def list_homes(self, utility=None):
+        if utility:
+            rows = self._connect().execute("SELECT DISTINCT home_id FROM days WHERE utility = ?", (utility,))
+        else:
+            rows = self._connect().execute("SELECT DISTINCT home_id FROM days")
+        return sorted(row[0] for row in rows)
+
+    # Insert or replace documents whose 'date' is already 'YYYY-MM-DD'
+    def put_documents(self, utility, docs):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO days (utility, home_id, date, doc) VALUES (?, ?, ?, ?)",
+                ((utility, doc['home_id'], doc['date'], json.dumps(doc, default=str)) for doc in docs)
+            )
+
+
+# Return the process-wide storage backend selected by STORAGE_BACKEND
+def get_storage():
+    global _storage
+    if _storage is None:
+        get_settings()
+        with _lock:
+            if _storage is None:
+                backend = os.getenv("STORAGE_BACKEND", "mongo").lower()
+                if backend == 'mongo':
+                    _storage = TieredStorage(MongoStorage(), ColdStorage())
+                elif backend == 'sqlite':
+                    _storage = SQLiteStorage(os.getenv("SQLITE_PATH", "meters.sqlite"))
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return _storage
+
+
+# Copy a date range of every utility from MongoDB into a local SQLite file
+def sync_to_sqlite(path, start, end, batch=1000):
+    target = SQLiteStorage(path)
+    counts = {}
+    for utility, spec in UTILITIES.items():
+        cursor = get_collection(utility).find(
+            {'date': {'$gte': _from_iso(start, spec['date_format']), '$lte': _from_iso(end, spec['date_format'])}},
+            {'_id': 0}
+        ).batch_size(batch)
+        docs = []
+        counts[utility] = 0
+        for doc in cursor:
+            docs.append(_normalize(doc, spec['date_format']))
+            if len(docs) >= batch:
+                target.put_documents(utility, docs)
+                counts[utility] += len(docs)
+                docs = []
+        target.put_documents(utility, docs)
+        counts[utility] += len(docs)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local storage backend")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync = subparsers.add_parser('sync', help="copy a date range from MongoDB into SQLite")
+    sync.add_argument('--start', required=True, help="first day (YYYY-MM-DD)")
+    sync.add_argument('--end', required=True, help="last day (YYYY-MM-DD)")
+    sync.add_argument('--path', default=None, help="SQLite file, defaults to SQLITE_PATH")
+    args = parser.parse_args()
+
+    get_settings()
+    path = args.path or os.getenv("SQLITE_PATH", "meters.sqlite")
+    for utility, count in sync_to_sqlite(path, args.start, args.end).items():
+        print(f"{utility}: {count} documents copied to {path}")
+
+
+if __name__ == '__main__':
+    main()
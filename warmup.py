@@ -0,0 +1,120 @@
+# 2026-10-18
+#
+# Cache warm-up for the default view.
+#
+# Every visitor starts on the previous day, so each worker loads that day for
+# all homes (one query per utility) into the data cache and renders the water
+# and electricity views into the figure cache: once at start-up and then daily
+# at the times in WARM_CACHE_AT (comma-separated HH:MM, local time), which
+# should fall after the upstream scoring job. WARM_CACHE=0 turns it off.
+#
+# With SHARED_CACHE=1 warmed entries use the closed-day TTL in cache.py, which
+# outlasts the gap between runs. Per-worker caches keep their short TTL so a
+# rescored day is not served stale for long; there, add a WARM_CACHE_AT time
+# shortly before the morning's first visits. Each home takes one data and two
+# figure cache entries; when the figure cache cannot hold the whole fleet only
+# the data cache is warmed, rather than have the warm-up evict the figures it
+# just rendered.
+
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_thread = None
+# Outcome of the last warm-up, reported by /readyz
+last_run = {}
+
+
+# Load `date` (default: previous day) for every home into the data and figure
+# caches, along with the day's fleet bands. With SHARED_CACHE=1 only the first
+# worker on the node to get here warms the shared caches for all of them; each
+# run `slot` ('startup' or a WARM_CACHE_AT time) is claimed separately, so a
+# worker restarting shortly before a scheduled run does not suppress it.
+def warm_previous_day(date=None, slot='startup'):
+    from cache import get_cache, invalidate_days
+    from dash_app import build_day_data, get_usage_dashboard, is_cacheable
+    from fleet import store_fleet_bands
+    from shared_cache import get_store
+    from storage import get_storage
+
+    started = time.monotonic()
+    date = date or (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+    store = get_store()
+    if store is not None and not store.claim(f'warmup:{date}:{slot}', float(os.getenv("WARM_CACHE_CLAIM_TTL", "3600"))):
+        last_run.update(date=date, skipped="warmed by another worker", finished_at=datetime.now().isoformat(timespec='seconds'))
+        return 0
+    # A run after rescoring must not keep serving figures rendered before it
+    invalidate_days([(None, date)])
+    storage = get_storage()
+    water_docs = storage.get_date('water', date)
+    electricity_docs = storage.get_date('electricity', date)
+
+    # The fleet bands come from the same documents, so they cost no extra query
+    for utility, docs in (('water', water_docs), ('electricity', electricity_docs)):
+        store_fleet_bands(utility, date, docs)
+
+    data_cache = get_cache('data')
+    homes = sorted(set(water_docs) | set(electricity_docs))
+    figure_room = get_cache('figure').maxsize
+    render = figure_room is None or figure_room >= 2 * len(homes)
+    if not render:
+        print(f"Warming only the data cache: {len(homes)} homes need FIGURE_CACHE_SIZE >= {2 * len(homes)}")
+    for home_id in homes:
+        data = build_day_data(water_docs.get(home_id), electricity_docs.get(home_id))
+        if is_cacheable(date, data):
+            data_cache.set((home_id, date), data)
+            if render:
+                for usage in ('water', 'electricity'):
+                    get_usage_dashboard(usage, date, home_id)
+
+    last_run.pop('skipped', None)
+    last_run.update(
+        date=date, homes=len(homes), figures=render, seconds=round(time.monotonic() - started, 3),
+        finished_at=datetime.now().isoformat(timespec='seconds')
+    )
+    return len(homes)
+
+
+# (seconds until the next configured HH:MM, that HH:MM), or (None, None) if no
+# schedule is set
+def next_run(now=None):
+    times = [t.strip() for t in os.getenv("WARM_CACHE_AT", "").split(',') if t.strip()]
+    if not times:
+        return None, None
+    now = now or datetime.now()
+    upcoming = []
+    for value in times:
+        hour, minute = (int(part) for part in value.split(':'))
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        upcoming.append((run, f'{hour:02}:{minute:02}'))
+    run, slot = min(upcoming)
+    return (run - now).total_seconds(), slot
+
+
+def _run():
+    slot = 'startup'
+    while True:
+        try:
+            warm_previous_day(slot=slot)
+        except Exception as e:
+            last_run.update(error=str(e), finished_at=datetime.now().isoformat(timespec='seconds'))
+            print(f"Error warming cache: {e}")
+        delay, slot = next_run()
+        if delay is None:
+            return
+        time.sleep(delay)
+
+
+# Start the background warm-up thread once per process
+def start():
+    global _thread
+    if os.getenv("WARM_CACHE", "1") == "0":
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='cache-warmup', daemon=True)
+            _thread.start()